@@ -1,13 +1,81 @@
 from hermes import master_settings
+from hermes.core.fetchers import ConcurrentFetcher
+from hermes.core.dispatchers import NotifierDispatcher
+from hermes.core.schedulers import AdaptiveScheduler
+from hermes.core.metrics import Metrics, JSONMetricsExporter, PrometheusTextfileExporter
+from hermes.core.exporters import get_exporter
+from hermes.core.exceptions import NotifierStillRunning
+from itertools import islice
+from pathlib import Path
+from time import sleep
 import logging
+import os
+import sys
 
 class App:
     def __init__(self, settings) -> None:
         self.settings = settings
-        self.scraper_objs = settings.scraper_objs
-        self.storage_obj = settings.storage_obj
-        self.notifier_objs = settings.notifier_objs
 
+        # objects from settings, built on first use
+        self._settings_objs = {}
+        self._metrics = None
+        self._dispatcher = None
+
+    def _get_settings_obj(self, name: str):
+        """
+        Settings can define objects directly or as functions returning them,
+        functions are called only when an action needs the object so that e.g. `info` stays fast
+        """
+
+        if name not in self._settings_objs:
+            obj = getattr(self.settings, name)
+            if callable(obj):
+                obj = obj()
+            self._settings_objs[name] = obj
+
+        return self._settings_objs[name]
+
+    @property
+    def scraper_objs(self) -> list:
+        return self._get_settings_obj("scraper_objs")
+
+    @property
+    def storage_obj(self):
+        return self._get_settings_obj("storage_obj")
+
+    @property
+    def notifier_objs(self) -> list:
+        return self._get_settings_obj("notifier_objs")
+
+    @property
+    def metrics(self) -> Metrics:
+        if self._metrics is None:
+            hooks = self._get_setting("METRICS_HOOKS")
+            if callable(hooks):
+                hooks = hooks()
+            hooks = list(hooks)
+
+            if self._get_setting("METRICS_JSON_PATH") is not None:
+                hooks.append(JSONMetricsExporter(Path(self._get_setting("METRICS_JSON_PATH"))))
+
+            if self._get_setting("METRICS_PROMETHEUS_PATH") is not None:
+                hooks.append(PrometheusTextfileExporter(Path(self._get_setting("METRICS_PROMETHEUS_PATH"))))
+
+            self._metrics = Metrics(hooks)
+
+        return self._metrics
+
+    @property
+    def dispatcher(self) -> NotifierDispatcher:
+        # kept for the lifetime of the app, so that `serve` knows about notifiers still running from earlier cycles
+        if self._dispatcher is None:
+            self._dispatcher = NotifierDispatcher(self._get_setting("MAX_CONCURRENT_NOTIFIERS"), self._get_setting("NOTIFIER_TIMEOUT"), self.metrics)
+
+        return self._dispatcher
+
+    def _get_setting(self, name: str):
+        # settings module may leave out optional settings
+        return getattr(self.settings, name, getattr(master_settings, name))
 
     def runbot(self, notify: bool=None) -> None:
         try:
@@ -16,43 +84,267 @@ class App:
             else:
                 NOTIFY = notify
 
-            MAX_ARTICLES = self.settings.MAX_ARTICLES
+            self._prepare_storage()
 
+            self._run_cycle(self.scraper_objs, NOTIFY)
+            
+            logging.info("Process finished")
+        except Exception:
+            logging.exception("")
 
-            with self.storage_obj as s:
-                s.create_tables_if_not_exist()
-                s.update_or_create_scrapers(self.scraper_objs)
+    def _prepare_storage(self) -> None:
+        if self._get_setting("PROFILE_QUERIES"):
+            self.storage_obj.enable_profiling()
 
-            new_articles = []
+        with self.storage_obj as s:
+            s.create_tables_if_not_exist()
+            s.update_or_create_scrapers(self.scraper_objs)
 
-            for scraper in self.scraper_objs:
+    def _run_cycle(self, scrapers: list, notify: bool) -> dict:
+        """
+        Scrapes, stores and notifies about new articles of `scrapers`
+        returns dict of scraper -> number of new articles it found
+        """
 
-                html = scraper.get_html()
-                data = scraper.get_data_from_html(html, MAX_ARTICLES)
+        self.metrics.start_run()
+        try:
+            with self.metrics.measure("run"):
+                return self._run_pipeline(scrapers, notify)
+        finally:
+            phases = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.metrics.run_phases.items())
+            logging.info(f"Time spent: {phases}")
+            self.metrics.finish_run()
 
+            if self.storage_obj.profiler is not None:
+                logging.info(self.storage_obj.get_profile_report())
 
-                with self.storage_obj as s:
-                    s.store(data, scraper)
+    def _run_pipeline(self, scrapers: list, notify: bool) -> dict:
+        MAX_ARTICLES = self.settings.MAX_ARTICLES
+        STOP_AFTER_KNOWN = self._get_setting("STOP_AFTER_KNOWN")
+        MAX_CONCURRENT_REQUESTS = self._get_setting("MAX_CONCURRENT_REQUESTS")
+        MAX_CONCURRENT_REQUESTS_PER_HOST = self._get_setting("MAX_CONCURRENT_REQUESTS_PER_HOST")
+        MAX_CONCURRENT_PAGES = self._get_setting("MAX_CONCURRENT_PAGES")
 
+        metrics = self.metrics
 
+        with self.storage_obj as s:
+            run_id = s.start_run()
+
+            # articles left new by an interrupted run, everything found by this run is added as it gets stored
+            with metrics.measure("get_new"):
+                new_articles = s.get_new()
+
+        fetcher = ConcurrentFetcher(MAX_CONCURRENT_REQUESTS, MAX_CONCURRENT_REQUESTS_PER_HOST, metrics)
+
+        unchanged_count = 0
+        failed_count = 0
+        found = {scraper: 0 for scraper in scrapers}
+
+        # all pages are requested at once, parsing and storing still happens in order
+        for scraper, html, ex in fetcher.fetch_all(scrapers):
+
+            # one failing scraper doesn't stop the others, its state stays as it was after the last stored page
+            if ex is not None:
+                logging.error(f"{scraper} failed to fetch its page", exc_info=ex)
+                failed_count += 1
+                continue
+
+            # not modified (304) or same fingerprint as in the last run
+            if html is None or scraper.is_page_unchanged(html):
+                scraper.mark_unchanged()
+                scraper.commit_http_cache(scraper.url)
+
+                logging.info(f"{scraper} page unchanged, skipping")
+                unchanged_count += 1
                 with self.storage_obj as s:
-                    new_articles = s.get_new()
+                    s.update_scraper_state(scraper)
+                continue
+
+            max_items = scraper.max_items if scraper.max_items is not None else MAX_ARTICLES
+            stop_after_known = scraper.stop_after_known if scraper.stop_after_known is not None else STOP_AFTER_KNOWN
+            max_pages = scraper.max_concurrent_pages if scraper.max_concurrent_pages is not None else MAX_CONCURRENT_PAGES
 
+            # pages stored before a failure are kept and notified about
+            stored = []
+            try:
+                self._scrape_pages(scraper, html, fetcher, stored, max_items, stop_after_known, max_pages)
+            except Exception:
+                logging.exception(f"{scraper} failed")
+                failed_count += 1
 
-            logging.info(f"Found {len(new_articles)} to save")
-            if NOTIFY and len(new_articles) > 0:
-                for notifier in self.notifier_objs:
-                    notifier.read_receivers_from_json()
-                    notifier.set_articles(new_articles)
-                    notifier.notify()
+            found[scraper] = len(stored)
+            new_articles += stored
 
+        if failed_count > 0:
+            logging.warning(f"{failed_count} of {len(scrapers)} scrapers failed")
 
-            with self.storage_obj as s:
+
+        logging.info(f"Skipped {unchanged_count} of {len(scrapers)} scrapers, pages unchanged")
+        logging.info(f"Found {len(new_articles)} to save")
+
+        delivered_run = self._notify(new_articles, run_id, notify)
+
+        with self.storage_obj as s:
+            with metrics.measure("mark_old"):
                 s.mark_old_all()
-            
-            logging.info("Process finished")
-        except Exception:
-            logging.exception("")
+            s.finish_run()
+
+        with self.storage_obj as s:
+            with metrics.measure("retention"):
+                archived = s.apply_retention(scrapers, delivered_run)
+
+        metrics.count("items_archived", archived)
+        if archived > 0:
+            logging.info(f"Archived {archived} expired articles")
+
+        return found
+
+    def _notify(self, new_articles: list, run_id: int, notify: bool) -> int:
+        """
+        Sends every notifier the new articles together with the ones it missed by failing or being skipped in earlier runs,
+        failure of one notifier doesn't stop the others
+        returns id of the last run delivered by all notifiers
+        """
+
+        notifiers = self.notifier_objs
+
+        with self.storage_obj as s:
+            last_runs = s.get_notifier_runs()
+
+            articles = {}
+            for notifier in notifiers:
+                # notifiers seen for the first time start with this run, late deliveries of timed out ones count too
+                last_run = max(last_runs.get(notifier.get_name(), run_id - 1), self.dispatcher.delivered.get(notifier, 0))
+                last_runs[notifier.get_name()] = last_run
+
+                missed = s.get_undelivered(last_run) if last_run < run_id - 1 else []
+                articles[notifier] = missed + new_articles
+
+        # nothing is owed for runs that don't notify
+        results = {}
+        if notify:
+            articles = {notifier: items for notifier, items in articles.items() if len(items) > 0}
+            if len(articles) > 0:
+                results = self.dispatcher.dispatch(articles, run_id)
+
+        for notifier in notifiers:
+            ex = results.get(notifier)
+            if ex is None:
+                last_runs[notifier.get_name()] = run_id
+            elif isinstance(ex, NotifierStillRunning):
+                logging.warning(f"{notifier.get_name()} skipped, its previous run is still going, articles are kept for its next run")
+            else:
+                logging.error(f"{notifier.get_name()} failed, articles are kept for its next run", exc_info=ex)
+
+        last_runs = {notifier.get_name(): last_runs[notifier.get_name()] for notifier in notifiers}
+        with self.storage_obj as s:
+            s.set_notifier_runs(last_runs)
+
+        return min(last_runs.values(), default=None)
+
+    def _scrape_pages(self, scraper, html: str, fetcher: ConcurrentFetcher, stored: list, max_items: int, stop_after_known: int, max_pages: int) -> None:
+        """
+        Stores the scraper's first page (`html`) and the following ones while they bring new articles,
+        stored articles are appended to `stored` page by page
+        """
+
+        page_stored, num_parsed = self._store_page(scraper, scraper.url, html, max_items, stop_after_known)
+        stored += page_stored
+        items_left = max_items - num_parsed
+
+        # following pages are only worth it while whole pages are new, a known article means the rest were seen before
+        if scraper.max_pages < 2 or num_parsed == 0 or len(page_stored) < num_parsed or items_left <= 0:
+            return
+
+        pages = fetcher.fetch_pages(scraper, islice(scraper.get_page_urls(), scraper.max_pages - 1), max_pages)
+        try:
+            for url, html in pages:
+                # not modified since the last run, so all of its articles are known
+                if html is None:
+                    break
+
+                page_stored, num_parsed = self._store_page(scraper, url, html, items_left, stop_after_known)
+                stored += page_stored
+                items_left -= num_parsed
+
+                if num_parsed == 0 or len(page_stored) < num_parsed or items_left <= 0:
+                    break
+        finally:
+            pages.close()
+
+    def _store_page(self, scraper, url: str, html: str, max_items: int, stop_after_known: int) -> tuple:
+        """
+        Parses and stores one page, returns (stored articles, number of articles parsed)
+        state of the scraper is updated only once the articles are stored
+        """
+
+        num_parsed = 0
+
+        def parse():
+            nonlocal num_parsed
+            for item in islice(scraper.get_data_from_html(html, max_items), max_items):
+                num_parsed += 1
+                yield item
+
+        # generator scrapers are consumed lazily, storage stops pulling once it reaches known articles,
+        # parse time doesn't include storing done in between
+        data = self.metrics.measure_iter("parse", parse(), "items_parsed", scraper=scraper.name)
+
+        with self.storage_obj as s:
+            with self.metrics.measure("store", scraper=scraper.name):
+                stored = s.store(data, scraper, stop_after_known)
+
+            # validators and fingerprint are kept only once the articles are stored,
+            # a failure before that makes the next run fetch and parse the page again
+            scraper.commit_http_cache(url)
+            if url == scraper.url:
+                scraper.update_fingerprint(html)
+            s.update_scraper_state(scraper)
+
+        data.close()
+        self.metrics.count("items_new", len(stored), scraper=scraper.name)
+
+        return stored, num_parsed
+
+    def serve(self, notify: bool=None) -> None:
+        """
+        Keeps the bot running, every scraper is polled on its own interval,
+        intervals adapt to how often scrapers find new articles
+        """
+
+        if not notify:
+            NOTIFY = self.settings.NOTIFY
+        else:
+            NOTIFY = notify
+
+        self._prepare_storage()
+
+        scheduler = AdaptiveScheduler(
+            self.scraper_objs,
+            default_interval=self._get_setting("POLL_INTERVAL"),
+            min_interval=self._get_setting("MIN_POLL_INTERVAL"),
+            max_interval=self._get_setting("MAX_POLL_INTERVAL"),
+            jitter=self._get_setting("POLL_JITTER"),
+        )
+
+        logging.info(f"Serving {len(self.scraper_objs)} scrapers")
+        try:
+            while True:
+                sleep(scheduler.get_time_until_next())
+
+                due = scheduler.pop_due()
+                found = {}
+                try:
+                    found = self._run_cycle(due, NOTIFY)
+                except Exception:
+                    logging.exception("")
+
+                for scraper in due:
+                    scheduler.reschedule(scraper, found.get(scraper, 0) > 0)
+        except KeyboardInterrupt:
+            logging.info("Stopped serving")
+        finally:
+            self.storage_obj.close()
 
 
     def deletedb(self) -> None:
@@ -61,43 +353,60 @@ class App:
 
         logging.info("DB deleted")
 
-    def getallrowsdb(self) -> None:
-        row_lists = []
-        with self.storage_obj as s:
-            row_lists = s.get_all_rows()
+    def _print_rows(self, rows) -> int:
+        count = 0
+        for row in rows:
+            if count == 0:
+                print(row.keys())
 
-        for rows in row_lists:
-            if len(rows) < 1:
-                continue
+            print([value for value in row])
+            count += 1
 
-            print(rows[0].keys())
-            for row in rows:
-                print([value for value in row])
-            print("="*50)
+        return count
+
+    def getallrowsdb(self) -> None:
+        with self.storage_obj as s:
+            for table in s.tables.values():
+                if self._print_rows(s.iter_rows_in_table(table)) > 0:
+                    print("="*50)
 
     def getarticles(self) -> None:
         with self.storage_obj as s:
-            articles = s.get_all_rows_in_table(s.tables["articles"])
+            if self._print_rows(s.iter_rows_in_table(s.tables["articles"])) < 1:
+                print("No articles found")
 
-        if len(articles) < 1:
-            print("No articles found")
+    def getscrapers(self) -> None:
+        with self.storage_obj as s:
+            if self._print_rows(s.iter_rows_in_table(s.tables["scrapers"])) < 1:
+                print("No scrapers found")
+
+    def _export(self, rows, format: str, output: Path=None) -> None:
+        """
+        Writes rows to `output` file or stdout one by one
+        """
+
+        if output is None:
+            try:
+                get_exporter(format, sys.stdout).write_rows(rows)
+                sys.stdout.flush()
+            except BrokenPipeError:
+                # reader went away early (e.g. `| head`), python would complain about it again when flushing at exit
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
             return
 
-        print(articles[0].keys())
-        for article in articles:
-            print([value for value in article])
+        with open(output, 'w', newline='', encoding='utf-8') as f:
+            count = get_exporter(format, f).write_rows(rows)
 
-    def getscrapers(self) -> None:
-        with self.storage_obj as s:
-            scrapers = s.get_all_rows_in_table(s.tables["scrapers"])
+        logging.info(f"Exported {count} rows to {output}")
 
-        if len(scrapers) < 1:
-            print("No scrapers found")
-            return
+    def exportarticles(self, format: str="csv", output: Path=None, scraper: str=None, since: str=None, until: str=None,
+                       is_new: bool=None, batch_size: int=1000) -> None:
+        with self.storage_obj as s:
+            self._export(s.iter_articles(scraper, since, until, is_new, batch_size), format, output)
 
-        print(scrapers[0].keys())
-        for scraper in scrapers:
-            print([value for value in scraper])
+    def exportscrapers(self, format: str="csv", output: Path=None, batch_size: int=1000) -> None:
+        with self.storage_obj as s:
+            self._export(s.iter_rows_in_table(s.tables["scrapers"], batch_size), format, output)
 
 
     def deletearticles(self) -> None:
@@ -118,6 +427,21 @@ class App:
 
         logging.info("All articles marked as old")
 
+    def applyretention(self) -> None:
+        with self.storage_obj as s:
+            s.create_tables_if_not_exist()
+
+            # articles some notifier hasn't delivered yet are kept
+            archived = s.apply_retention(self.scraper_objs, min(s.get_notifier_runs().values(), default=None))
+
+        logging.info(f"Archived {archived} expired articles")
+
+    def vacuumdb(self) -> None:
+        with self.storage_obj as s:
+            s.vacuum()
+
+        logging.info("DB vacuumed")
+
     def info(self) -> None:
         print(f"You are running Hermes Framework version: {master_settings.VERSION}")
         print(f"Source: {master_settings.GITHUB_LINK}")
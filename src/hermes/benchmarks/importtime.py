@@ -0,0 +1,85 @@
+"""
+Import-time regression check for manage.py
+
+Runs an action (`info` by default) with `python -X importtime` and fails
+if it imports any of the heavy dependencies or its imports take longer than the budget
+
+    python -m hermes.benchmarks.importtime --project-dir src --budget-ms 150
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Tuple
+
+# modules that actions which don't scrape, store or notify shouldn't load
+HEAVY_MODULES = ["requests", "bs4", "smtplib", "ssl", "sqlite3"]
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+def measure_imports(project_dir: Path, action: str) -> Tuple[float, set]:
+    """
+    Returns time spent importing modules after interpreter startup (in ms) and names of all imported modules
+    """
+
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "manage.py", action],
+        cwd=project_dir,
+        capture_output=True,
+        text=True,
+    )
+
+    if process.returncode != 0:
+        raise RuntimeError(f"`manage.py {action}` failed:\n{process.stderr}")
+
+    total_us = 0
+    modules = set()
+    after_startup = False
+
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+
+        cumulative_us, indent, name = int(match.group(2)), match.group(3), match.group(4)
+        modules.add(name)
+
+        # `site` is the last module imported by the interpreter itself, only top level imports are summed
+        if len(indent) == 0:
+            if after_startup:
+                total_us += cumulative_us
+            elif name == "site":
+                after_startup = True
+
+    return total_us / 1000, modules
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Checks that manage.py actions start fast')
+    parser.add_argument('--project-dir', type=Path, default=Path.cwd(), help='Directory with manage.py and settings.py')
+    parser.add_argument('--action', type=str, default='info', help='Action to measure')
+    parser.add_argument('--budget-ms', type=float, default=150, help='Max time spent on imports')
+    args = parser.parse_args()
+
+    import_ms, modules = measure_imports(args.project_dir, args.action)
+    heavy = [name for name in HEAVY_MODULES if name in modules]
+
+    print(f"`manage.py {args.action}` imports took {import_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    failed = False
+    if len(heavy) > 0:
+        print(f"FAIL: heavy modules imported: {', '.join(heavy)}")
+        failed = True
+
+    if import_ms > args.budget_ms:
+        print("FAIL: import time over budget")
+        failed = True
+
+    if not failed:
+        print("OK")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
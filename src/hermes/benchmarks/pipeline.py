@@ -0,0 +1,292 @@
+"""
+End-to-end benchmark of `App.runbot` against local HTTP and SMTP stand-ins
+
+Every scenario first runs the bot once to fill the database, then publishes
+`new_ratio` of a page worth of new articles on `changed_ratio` of the pages (the others answer 304)
+and measures the second run: wall time, time spent in each phase, SQL statements executed and peak memory
+
+    python -m hermes.benchmarks.pipeline --scrapers 1,20 --articles 50 --new-ratio 0.1,1 --receivers 0,500 --recipients-per-envelope 1,50
+    python -m hermes.benchmarks.pipeline --save baseline.json
+    python -m hermes.benchmarks.pipeline --compare baseline.json
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+import tempfile
+import tracemalloc
+from collections import Counter
+from itertools import product
+from math import ceil
+from pathlib import Path
+from time import perf_counter, strftime
+from types import SimpleNamespace
+
+from hermes.app import App
+from hermes.benchmarks.servers import ArticleServer, SMTPSink
+from hermes.core import fields
+from hermes.core.mailers import BaseMailer
+from hermes.core.scrapers import BaseScraper
+from hermes.core.storages import SimpleStorage
+
+PHASES = ["fetch", "parse", "store", "get_new", "notify", "mark_old"]
+
+# changes smaller than this (in seconds) are treated as noise when comparing with a baseline
+MIN_TIME_DIFFERENCE = 0.005
+
+ARTICLE_PATTERN = re.compile(r'<h2><a href="([^"]+)">([^<]+)</a></h2><time datetime="([^"]+)">')
+
+class BenchmarkScraper(BaseScraper):
+    name = "benchmark"
+
+    def __init__(self, url: str, name: str) -> None:
+        self.name = name
+        super().__init__(url=url)
+
+    def get_data_from_html(self, html: str, max_items: int=None):
+        for match in ARTICLE_PATTERN.finditer(html):
+            yield {
+                "title": match.group(2),
+                "url": match.group(1),
+                "date_published": match.group(3),
+            }
+
+class BenchmarkStorage(SimpleStorage):
+    DB_NAME = "benchmark.db"
+
+    fields = [
+        fields.TextFieldSQLite(name="title", null=False, use_to_identify=True),
+        fields.TextFieldSQLite(name="url", null=False),
+        fields.TextFieldSQLite(name="date_published", null=True),
+    ]
+
+    def __init__(self, parent_dir: str) -> None:
+        super().__init__(parent_dir)
+
+        # executed statements by their first keyword (INSERT, SELECT...)
+        self.statements = Counter()
+
+    def connect(self):
+        conn = super().connect()
+        conn.set_trace_callback(self.count_statement)
+        return conn
+
+    def count_statement(self, sql: str) -> None:
+        self.statements[sql.lstrip().split(None, 1)[0].upper()] += 1
+
+    def reset_counters(self) -> None:
+        self.statements.clear()
+
+class BenchmarkMailer(BaseMailer):
+
+    # receivers are spread over this many profiles, see `get_profile_key`
+    NUM_PROFILES = 10
+
+    def get_message_body(self, articles: list, reciever: dict) -> str:
+        items = ''.join(
+            f'<li><a href="{article["url"]}">{article["title"]}</a> - {article["scraper_verbose_name"]}</li>'
+            for article in articles
+        )
+
+        # only what the profile key covers, bodies are shared by all receivers of a profile
+        return f'<p>New articles in your {reciever["profile"]} digest:</p><ul>{items}</ul>'
+
+    def get_profile_key(self, reciever: dict):
+        return reciever["profile"]
+
+def get_scenario_name(params: dict) -> str:
+    return ','.join(f"{key}={value}" for key, value in params.items())
+
+def run_once(params: dict, http: ArticleServer, smtp: SMTPSink, trace_memory: bool=False) -> dict:
+    """
+    Fills a fresh database, publishes new articles and measures the run that finds them
+    """
+
+    num_scrapers, num_articles, new_ratio, num_receivers = params["scrapers"], params["articles"], params["new_ratio"], params["receivers"]
+    num_new = round(num_articles * new_ratio)
+    num_changed = ceil(num_scrapers * params["changed_ratio"])
+
+    with tempfile.TemporaryDirectory(prefix="hermes-benchmark-") as workdir:
+        receivers_path = Path(workdir, "receivers.jsonl")
+        with open(receivers_path, 'w') as f:
+            for i in range(num_receivers):
+                f.write(json.dumps({"address": f"receiver{i}@example.com", "name": f"Receiver {i}", "profile": f"profile{i % BenchmarkMailer.NUM_PROFILES}"}) + "\n")
+
+        storage = BenchmarkStorage(workdir)
+        settings = SimpleNamespace(
+            NOTIFY=False,
+            MAX_ARTICLES=num_articles,
+            scraper_objs=[BenchmarkScraper(http.get_url(i), f"benchmark_{i}") for i in range(num_scrapers)],
+            storage_obj=storage,
+            notifier_objs=[BenchmarkMailer(
+                receivers_path=receivers_path,
+                smtp_port=smtp.port,
+                smtp_server="127.0.0.1",
+                bot_email="hermes@example.com",
+                bot_password="",
+                smtp_use_tls=False,
+                recipients_per_envelope=params["recipients_per_envelope"],
+            )],
+        )
+        app = App(settings)
+
+        try:
+            app.runbot()
+
+            http.publish(num_new, num_changed)
+            http.reset_counters()
+            smtp.reset_counters()
+            storage.reset_counters()
+            settings.NOTIFY = num_receivers > 0
+
+            if trace_memory:
+                tracemalloc.start()
+
+            start = perf_counter()
+            app.runbot()
+            wall_time = perf_counter() - start
+
+            peak_memory = None
+            if trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        finally:
+            storage.close()
+
+    # per-phase timings and counters of the measured run, collected by the app itself
+    phases = app.metrics.run_phases
+    counters = app.metrics.run_counters
+
+    # runbot logs exceptions instead of raising them, a failed run must not pass as a fast one
+    stored = counters.get("items_new", 0)
+    if stored != num_changed * num_new:
+        raise RuntimeError(f"Scenario {get_scenario_name(params)} stored {stored} articles instead of {num_changed * num_new}, see the log")
+
+    if num_new > 0 and smtp.recipients != num_receivers:
+        raise RuntimeError(f"Scenario {get_scenario_name(params)} mailed {smtp.recipients} receivers instead of {num_receivers}, see the log")
+
+    return {
+        "wall_time": wall_time,
+        "phases": {phase: phases.get(phase, 0.0) for phase in PHASES},
+        "sql_statements": dict(storage.statements),
+        "peak_memory": peak_memory,
+        "requests": http.requests,
+        "not_modified": http.not_modified,
+        "bytes_downloaded": http.bytes_sent,
+        "new_articles": stored,
+        "emails_sent": smtp.messages,
+    }
+
+def run_scenario(params: dict, repeat: int=3) -> dict:
+    """
+    Timings come from the fastest of `repeat` runs, peak memory from one more run with tracemalloc
+    which would slow the timed runs down
+    """
+
+    with ArticleServer(params["scrapers"], params["articles"]) as http, SMTPSink() as smtp:
+        results = [run_once(params, http, smtp) for i in range(repeat)]
+        traced = run_once(params, http, smtp, trace_memory=True)
+
+    rv = min(results, key=lambda result: result["wall_time"])
+    rv["peak_memory"] = traced["peak_memory"]
+    return rv
+
+def compare_results(name: str, result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns descriptions of metrics that got worse than the baseline
+    """
+
+    regressions = []
+
+    def check_time(metric: str, current: float, previous: float) -> None:
+        if current > previous * (1 + tolerance) and current - previous > MIN_TIME_DIFFERENCE:
+            regressions.append(f"{name}: {metric} {previous * 1000:.1f} ms -> {current * 1000:.1f} ms")
+
+    check_time("wall_time", result["wall_time"], baseline["wall_time"])
+    for phase in PHASES:
+        check_time(phase, result["phases"][phase], baseline["phases"].get(phase, 0.0))
+
+    # statement counts don't depend on the machine, any increase is a regression
+    for statement, count in result["sql_statements"].items():
+        previous = baseline["sql_statements"].get(statement, 0)
+        if count > previous:
+            regressions.append(f"{name}: {statement} statements {previous} -> {count}")
+
+    if baseline.get("peak_memory") and result["peak_memory"] > baseline["peak_memory"] * (1 + tolerance):
+        regressions.append(f"{name}: peak_memory {baseline['peak_memory'] / 1024:.0f} KiB -> {result['peak_memory'] / 1024:.0f} KiB")
+
+    return regressions
+
+def print_result(name: str, result: dict) -> None:
+    phases = ' '.join(f"{phase}={seconds * 1000:.1f}" for phase, seconds in result["phases"].items())
+    statements = ' '.join(f"{statement}={count}" for statement, count in sorted(result["sql_statements"].items()))
+
+    print(name)
+    print(f"    wall {result['wall_time'] * 1000:.1f} ms | peak memory {result['peak_memory'] / 1024:.0f} KiB | "
+          f"{result['requests']} requests ({result['not_modified']} not modified), {result['bytes_downloaded'] / 1024:.0f} KiB | {result['new_articles']} new articles | {result['emails_sent']} emails")
+    print(f"    phases (ms): {phases}")
+    print(f"    sql: {statements}")
+
+def parse_list(type_):
+    return lambda value: [type_(item) for item in value.split(',')]
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of runbot with local HTTP and SMTP servers')
+    parser.add_argument('--scrapers', type=parse_list(int), default=[1, 20], help='Comma separated scraper counts')
+    parser.add_argument('--articles', type=parse_list(int), default=[50], help='Comma separated numbers of articles per page')
+    parser.add_argument('--new-ratio', type=parse_list(float), default=[0.1, 1.0], help='Comma separated fractions of a page that are new articles')
+    parser.add_argument('--changed-ratio', type=parse_list(float), default=[0.5], help='Comma separated fractions of pages that get new articles, the rest answer 304')
+    parser.add_argument('--receivers', type=parse_list(int), default=[0, 200], help='Comma separated receiver counts')
+    parser.add_argument('--recipients-per-envelope', type=parse_list(int), default=[1, 50], help='Comma separated envelope sizes, 1 sends every receiver its own message')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per scenario, the fastest one is reported')
+    parser.add_argument('--save', type=Path, default=None, help='Save results as a baseline to this JSON file')
+    parser.add_argument('--compare', type=Path, default=None, help='Compare results with a baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative slowdown and memory growth')
+    args = parser.parse_args()
+
+    # runs log every found article otherwise
+    logging.basicConfig(level=logging.WARNING)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)["scenarios"]
+
+    results = {}
+    regressions = []
+
+    for scrapers, articles, new_ratio, changed_ratio, receivers, envelope in product(args.scrapers, args.articles, args.new_ratio, args.changed_ratio, args.receivers, args.recipients_per_envelope):
+        # envelope size makes no difference without receivers
+        if receivers == 0 and envelope != args.recipients_per_envelope[0]:
+            continue
+
+        params = {"scrapers": scrapers, "articles": articles, "new_ratio": new_ratio, "changed_ratio": changed_ratio, "receivers": receivers, "recipients_per_envelope": envelope}
+        name = get_scenario_name(params)
+
+        result = run_scenario(params, args.repeat)
+        results[name] = result
+        print_result(name, result)
+
+        if baseline is not None:
+            if name in baseline:
+                regressions += compare_results(name, result, baseline[name], args.tolerance)
+            else:
+                print(f"    no baseline for this scenario")
+
+    if args.save is not None:
+        with open(args.save, 'w') as f:
+            json.dump({"created_at": strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0], "scenarios": results}, f, indent=4)
+        print(f"Baseline saved to {args.save}")
+
+    if len(regressions) > 0:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"    {regression}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
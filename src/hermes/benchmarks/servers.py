@@ -0,0 +1,224 @@
+"""
+Local stand-ins for the websites and the SMTP server used by benchmarks
+"""
+
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+class ArticleServer():
+    """
+    Serves a synthetic page of articles, newest first, for every source at `/<source number>`
+
+    `publish` adds new articles on top of a page, the oldest ones drop off the bottom,
+    pages have ETags so conditional requests for unchanged ones get 304
+    """
+
+    ARTICLE_TEMPLATE = (
+        '<article class="post">'
+        '<h2><a href="/{source}/articles/{number}">Article {number} of source {source}</a></h2>'
+        '<time datetime="2024-01-01T00:00:00">1 January 2024</time>'
+        '<p>Summary of article {number}. Lorem ipsum dolor sit amet, consectetur adipiscing elit, '
+        'sed do eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>'
+        '</article>'
+    )
+
+    def __init__(self, num_sources: int, articles_per_page: int) -> None:
+        self.num_sources = num_sources
+        self.articles_per_page = articles_per_page
+
+        # number of the newest article and rendered page, by source
+        self.heads = [articles_per_page] * num_sources
+        self.pages = [self.render_page(source) for source in range(num_sources)]
+
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.lock = Lock()
+
+        self.server = None
+
+    def render_page(self, source: int) -> bytes:
+        head = self.heads[source]
+        articles = ''.join(
+            self.ARTICLE_TEMPLATE.format(source=source, number=number)
+            for number in range(head, max(head - self.articles_per_page, 0), -1)
+        )
+
+        return f'<!DOCTYPE html><html><head><title>Source {source}</title></head><body><main>{articles}</main></body></html>'.encode()
+
+    def get_etag(self, source: int) -> str:
+        return f'"{source}-{self.heads[source]}"'
+
+    def publish(self, count: int, num_sources: int=None) -> None:
+        """
+        Adds `count` new articles to the first `num_sources` pages (all by default)
+        """
+
+        if num_sources is None:
+            num_sources = self.num_sources
+
+        for source in range(num_sources):
+            self.heads[source] += count
+            self.pages[source] = self.render_page(source)
+
+    def get_url(self, source: int) -> str:
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/{source}"
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.not_modified = 0
+            self.bytes_sent = 0
+
+    def start(self) -> None:
+        article_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, so that scraper sessions reuse connections like with real sites
+            protocol_version = "HTTP/1.1"
+
+            # headers and body are sent together, otherwise delayed ACKs add ~40 ms to every local request
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                try:
+                    source = int(self.path.strip('/'))
+                    body = article_server.pages[source]
+                except (ValueError, IndexError):
+                    self.send_error(404)
+                    return
+
+                etag = article_server.get_etag(source)
+
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+
+                    with article_server.lock:
+                        article_server.requests += 1
+                        article_server.not_modified += 1
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+                with article_server.lock:
+                    article_server.requests += 1
+                    article_server.bytes_sent += len(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True, name="hermes-benchmark-http").start()
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+class SMTPSink():
+    """
+    Accepts and counts every message, without TLS and authentication
+    """
+
+    def __init__(self) -> None:
+        self.connections = 0
+        self.messages = 0
+        self.recipients = 0
+        self.bytes_received = 0
+        self.lock = Lock()
+
+        self.server = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.connections = 0
+            self.messages = 0
+            self.recipients = 0
+            self.bytes_received = 0
+
+    def start(self) -> None:
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line: str) -> None:
+                self.wfile.write(f"{line}\r\n".encode())
+
+            def handle(self) -> None:
+                with sink.lock:
+                    sink.connections += 1
+
+                self.reply("220 hermes-benchmark")
+                recipients = 0
+
+                for line in self.rfile:
+                    command = line.decode(errors="replace").strip().upper()
+
+                    if command.startswith(("EHLO", "HELO")):
+                        self.reply("250 hermes-benchmark")
+                    elif command.startswith("MAIL"):
+                        recipients = 0
+                        self.reply("250 OK")
+                    elif command.startswith("RCPT"):
+                        recipients += 1
+                        self.reply("250 OK")
+                    elif command == "DATA":
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+
+                        size = 0
+                        for data_line in self.rfile:
+                            if data_line in (b".\r\n", b".\n"):
+                                break
+                            size += len(data_line)
+
+                        with sink.lock:
+                            sink.messages += 1
+                            sink.recipients += recipients
+                            sink.bytes_received += size
+
+                        self.reply("250 OK")
+                    elif command in ("RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif command == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        Thread(target=self.server.serve_forever, daemon=True, name="hermes-benchmark-smtp").start()
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
@@ -0,0 +1,88 @@
+import gzip
+import json
+import sqlite3
+from pathlib import PurePath
+
+from hermes.core import fields, tables
+
+class BaseArchive():
+    """
+    Base class for archives of articles removed from storage by retention
+    """
+
+    def write(self, records: list) -> None:
+        """
+        Appends `records` (dicts) to the archive
+        """
+        raise NotImplementedError()
+
+    def iter_records(self):
+        raise NotImplementedError()
+
+    def __iter__(self):
+        return self.iter_records()
+
+class JSONLinesArchive(BaseArchive):
+    """
+    Appends records to a gzip compressed JSON Lines file,
+    every write adds a new gzip member, so nothing already written is rewritten
+    """
+
+    def __init__(self, path: PurePath=None, compresslevel: int=6) -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+        self.compresslevel = compresslevel
+
+    def write(self, records: list) -> None:
+        with gzip.open(self.path, 'at', compresslevel=self.compresslevel, encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def iter_records(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+class SQLiteArchive(BaseArchive):
+    """
+    Keeps records in a separate SQLite database as JSON, so it doesn't depend on the Articles table's columns
+    """
+
+    def __init__(self, path: PurePath=None, table_name: str="ArchivedArticles") -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+        self.table = tables.BaseTable(name=table_name, fields=[
+            fields.IntegerFieldSQLite(name="archived_id", primary_key=True),
+            fields.TextFieldSQLite(name="scraper_name", null=True),
+            fields.TextFieldSQLite(name="data", null=False),
+        ])
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path))
+        conn.execute(self.table.compile().create_sql)
+        return conn
+
+    def write(self, records: list) -> None:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    self.table.compile().insert_sql,
+                    ((record.get('scraper_name'), json.dumps(record, default=str)) for record in records),
+                )
+        finally:
+            conn.close()
+
+    def iter_records(self):
+        conn = self.connect()
+        try:
+            for row in conn.execute(f"SELECT data FROM {self.table.name} ORDER BY archived_id"):
+                yield json.loads(row[0])
+        finally:
+            conn.close()
@@ -0,0 +1,107 @@
+from queue import Queue, Empty
+from threading import Thread
+from time import monotonic
+
+from hermes.core.exceptions import NotifierStillRunning
+from hermes.core.metrics import Metrics
+
+class NotifierDispatcher():
+    """
+    Runs notifiers concurrently, each one in its own thread,
+    a notifier that fails or stalls doesn't stop the others
+    """
+
+    def __init__(self, max_notifiers: int=4, timeout: float=None, metrics: Metrics=None) -> None:
+        if isinstance(max_notifiers, int) and max_notifiers > 0:
+            self.max_notifiers = max_notifiers
+        else:
+            raise TypeError(f"`max_notifiers` argument must be a positive int, not '{max_notifiers}'")
+
+        if timeout is None or (isinstance(timeout, (int, float)) and timeout > 0):
+            self.timeout = timeout
+        else:
+            raise TypeError(f"`timeout` argument must be a positive number, not '{timeout}'")
+
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # last thread of every notifier, timed out ones may still be running during later dispatches
+        self.threads = {}
+
+        # notifier -> id of the last run it delivered, including late deliveries of timed out notifiers
+        self.delivered = {}
+
+    def run_notifier(self, notifier, articles: list, run_id: int, finished: Queue) -> None:
+        ex = None
+        name = type(notifier).__name__
+
+        try:
+            with self.metrics.measure("notify", notifier=name):
+                # the baseline entry point, it calls `read_receivers`, so overriding either one works
+                notifier.read_receivers_from_json()
+                notifier.set_articles(articles)
+                notifier.set_run_id(run_id)
+                notifier.notify()
+        except Exception as e:
+            ex = e
+        else:
+            self.delivered[notifier] = run_id
+
+        self.metrics.count("notifications_sent", notifier.notifications_sent, notifier=name)
+
+        finished.put((notifier, ex))
+
+    def dispatch(self, articles: dict, run_id: int=None) -> dict:
+        """
+        Runs at most `max_notifiers` notifiers at once and waits until all of them finish or time out,
+        `articles` is a dict of notifier -> list of articles it has to deliver
+
+        Returns dict of notifier -> exception it raised (TimeoutError if it didn't finish in time) or None
+        Threads of timed out notifiers are daemonic, they are left running in the background
+        and the notifier is skipped (NotifierStillRunning) until its thread finishes
+        """
+
+        results = {}
+        pending = list(articles)
+        finished = Queue()
+
+        # running notifiers with their deadlines
+        running = {}
+
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < self.max_notifiers:
+                notifier = pending.pop(0)
+
+                # the old thread still uses the notifier's articles, receivers and connections
+                previous = self.threads.get(notifier)
+                if previous is not None and previous.is_alive():
+                    results[notifier] = NotifierStillRunning("Notifier's previous run hasn't finished yet, skipping")
+                    continue
+
+                running[notifier] = monotonic() + self.timeout if self.timeout is not None else None
+
+                thread = Thread(target=self.run_notifier, args=(notifier, articles[notifier], run_id, finished), daemon=True, name=f"hermes-notify-{type(notifier).__name__}")
+                thread.start()
+                self.threads[notifier] = thread
+
+            # every remaining notifier was skipped
+            if len(running) == 0:
+                break
+
+            deadlines = [deadline for deadline in running.values() if deadline is not None]
+            wait_time = max(0, min(deadlines) - monotonic()) if len(deadlines) > 0 else None
+
+            try:
+                notifier, ex = finished.get(timeout=wait_time)
+
+                # notifiers that already timed out are ignored
+                if notifier in running:
+                    del running[notifier]
+                    results[notifier] = ex
+            except Empty:
+                now = monotonic()
+                for notifier, deadline in list(running.items()):
+                    if deadline is not None and deadline <= now:
+                        del running[notifier]
+                        results[notifier] = TimeoutError(f"Notifier didn't finish in {self.timeout} seconds")
+
+        return results
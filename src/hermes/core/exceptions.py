@@ -5,4 +5,10 @@ class NoNewArticles(Exception):
     pass
 
 class ActionDoesNotExistError(Exception):
+    pass
+
+class PageNotModified(Exception):
+    pass
+
+class NotifierStillRunning(Exception):
     pass
\ No newline at end of file
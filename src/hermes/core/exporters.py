@@ -0,0 +1,63 @@
+import csv
+import json
+
+def to_exportable(value):
+    # blobs (e.g. article keys) are written as hex
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+class BaseExporter():
+    """
+    Base class for exporters writing rows to a text file object one by one
+    """
+
+    def __init__(self, file) -> None:
+        self.file = file
+
+    def write_rows(self, rows) -> int:
+        """
+        Writes all `rows` (sqlite3.Row or other mappings with `keys()`), returns number of written rows
+        """
+        raise NotImplementedError()
+
+class CSVExporter(BaseExporter):
+    def write_rows(self, rows) -> int:
+        writer = csv.writer(self.file)
+
+        count = 0
+        for row in rows:
+            # header comes from the first row, nothing at all is written for no rows
+            if count == 0:
+                writer.writerow(row.keys())
+
+            writer.writerow([to_exportable(value) for value in row])
+            count += 1
+
+        return count
+
+class JSONLinesExporter(BaseExporter):
+    def write_rows(self, rows) -> int:
+        count = 0
+        keys = None
+
+        for row in rows:
+            if keys is None:
+                keys = row.keys()
+
+            self.file.write(json.dumps(dict(zip(keys, map(to_exportable, row))), default=str) + "\n")
+            count += 1
+
+        return count
+
+EXPORTERS = {
+    "csv": CSVExporter,
+    "jsonl": JSONLinesExporter,
+    "ndjson": JSONLinesExporter,
+}
+
+def get_exporter(format: str, file) -> BaseExporter:
+    try:
+        return EXPORTERS[format](file)
+    except KeyError:
+        raise NotImplementedError(f"Unknown export format '{format}', use one of: {', '.join(EXPORTERS)}")
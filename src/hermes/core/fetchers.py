@@ -0,0 +1,159 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from threading import BoundedSemaphore, Condition, Lock
+from urllib.parse import urlparse
+
+from hermes.core.scrapers import BaseScraper
+from hermes.core.exceptions import PageNotModified
+from hermes.core.metrics import Metrics
+
+class ConcurrentFetcher():
+    """
+    Fetches html for many scrapers at once,
+    limits the number of simultaneous requests globally and per host
+    """
+
+    def __init__(self, max_requests: int=8, max_requests_per_host: int=2, metrics: Metrics=None) -> None:
+        if isinstance(max_requests, int) and max_requests > 0:
+            self.max_requests = max_requests
+        else:
+            raise TypeError(f"`max_requests` argument must be a positive int, not '{max_requests}'")
+
+        if isinstance(max_requests_per_host, int) and max_requests_per_host > 0:
+            self.max_requests_per_host = max_requests_per_host
+        else:
+            raise TypeError(f"`max_requests_per_host` argument must be a positive int, not '{max_requests_per_host}'")
+
+        self.metrics = metrics if metrics is not None else Metrics()
+
+        # following pages of scrapers are fetched by their own threads, so the global limit needs a semaphore too
+        self.semaphore = BoundedSemaphore(self.max_requests)
+        self.host_semaphores = {}
+        self.lock = Lock()
+
+    def get_host(self, url: str) -> str:
+        return urlparse(url).netloc
+
+    def get_host_semaphore(self, url: str) -> BoundedSemaphore:
+        host = self.get_host(url)
+
+        with self.lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = BoundedSemaphore(self.max_requests_per_host)
+
+            return self.host_semaphores[host]
+
+    def fetch(self, scraper: BaseScraper, url: str=None) -> str:
+        """
+        Returns html of the scraper's page (`url` by default), or None if it hasn't changed since the last request
+        """
+
+        if url is None:
+            url = scraper.url
+
+        # host slot first, a global slot is only taken by a request that can start right away
+        with self.get_host_semaphore(url), self.semaphore:
+            try:
+                # time waiting for the semaphores isn't counted
+                with self.metrics.measure("fetch", scraper=scraper.name):
+                    return scraper.get_html(url)
+            except PageNotModified:
+                return None
+            finally:
+                self.metrics.count("bytes_downloaded", scraper.response_sizes.get(url, 0), scraper=scraper.name)
+
+    def fetch_all(self, scrapers: list):
+        """
+        Generator function, starts fetching all scrapers at once
+        yields (scraper, html, exception) tuples in the same order as `scrapers`, as soon as each one is ready,
+        html is None for pages that haven't changed or failed, exception is the one raised by `get_html` or None
+
+        Every host has its own queue, workers take the next scraper of the host with the most queued ones that has a free slot,
+        so scrapers of a busy host never occupy workers that requests to other hosts could use
+        and the busy host, which takes the longest, always has its slots in use
+        """
+
+        futures = [Future() for scraper in scrapers]
+
+        # indexes of scrapers waiting for a worker and number of running requests, by host
+        queues = {}
+        running = {}
+        for i, scraper in enumerate(scrapers):
+            queues.setdefault(self.get_host(scraper.url), deque()).append(i)
+            running.setdefault(self.get_host(scraper.url), 0)
+
+        condition = Condition()
+        closed = False
+
+        def get_next_host() -> str:
+            hosts = [host for host, queue in queues.items() if len(queue) > 0 and running[host] < self.max_requests_per_host]
+            return max(hosts, key=lambda host: len(queues[host]), default=None)
+
+        def work() -> None:
+            while True:
+                with condition:
+                    while True:
+                        if closed or all(len(queue) == 0 for queue in queues.values()):
+                            return
+
+                        host = get_next_host()
+                        if host is not None:
+                            break
+
+                        condition.wait()
+
+                    i = queues[host].popleft()
+                    running[host] += 1
+
+                try:
+                    futures[i].set_result(self.fetch(scrapers[i]))
+                except Exception as e:
+                    futures[i].set_exception(e)
+                finally:
+                    with condition:
+                        running[host] -= 1
+                        condition.notify_all()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_requests, thread_name_prefix="hermes-fetch")
+        try:
+            for worker in range(min(self.max_requests, len(scrapers))):
+                executor.submit(work)
+
+            for scraper, future in zip(scrapers, futures):
+                ex = future.exception()
+                yield scraper, (future.result() if ex is None else None), ex
+        finally:
+            with condition:
+                closed = True
+                condition.notify_all()
+            executor.shutdown(wait=True)
+
+    def fetch_pages(self, scraper: BaseScraper, urls, max_pages: int=4):
+        """
+        Generator function, fetches `urls` of one scraper keeping at most `max_pages` of them in flight ahead of the consumer,
+        yields (url, html) tuples in order, html is None for pages that haven't changed
+
+        Closing the generator cancels pages that haven't been requested yet,
+        so stopping early costs at most `max_pages` extra requests
+        """
+
+        if not isinstance(max_pages, int) or max_pages <= 0:
+            raise TypeError(f"`max_pages` argument must be a positive int, not '{max_pages}'")
+
+        urls = iter(urls)
+        executor = ThreadPoolExecutor(max_workers=max_pages, thread_name_prefix="hermes-page")
+        try:
+            pending = deque((url, executor.submit(self.fetch, scraper, url)) for url in islice(urls, max_pages))
+
+            while len(pending) > 0:
+                url, future = pending.popleft()
+                html = future.result()
+
+                # the next page is requested before this one is handed over for parsing
+                for next_url in islice(urls, 1):
+                    pending.append((next_url, executor.submit(self.fetch, scraper, next_url)))
+
+                yield url, html
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
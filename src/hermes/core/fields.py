@@ -1,3 +1,80 @@
+import re
+from functools import lru_cache
+from math import isinf, isnan
+
+# text SQLite converts to a number in columns with numeric affinity
+NUMERIC_TEXT_PATTERN = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*", re.ASCII)
+INTEGER_TEXT_PATTERN = re.compile(r"\s*[+-]?\d+\s*", re.ASCII)
+
+MIN_INTEGER, MAX_INTEGER = -2**63, 2**63 - 1
+
+@lru_cache(maxsize=None)
+def get_type_affinity(data_type: str) -> str:
+    """
+    Returns SQLite's type affinity (INTEGER, TEXT, BLOB, REAL or NUMERIC) of a declared column type
+    """
+
+    data_type = data_type.upper()
+
+    if "INT" in data_type:
+        return "INTEGER"
+    if "CHAR" in data_type or "CLOB" in data_type or "TEXT" in data_type:
+        return "TEXT"
+    if "BLOB" in data_type or data_type == "":
+        return "BLOB"
+    if "REAL" in data_type or "FLOA" in data_type or "DOUB" in data_type:
+        return "REAL"
+    return "NUMERIC"
+
+def apply_affinity(value, affinity: str):
+    """
+    Returns `value` converted the way SQLite converts it when storing in a column with `affinity`
+    """
+
+    # sqlite3 binds bools as integers
+    if isinstance(value, bool):
+        value = int(value)
+
+    # NaN is bound as NULL
+    if isinstance(value, float) and isnan(value):
+        return None
+
+    if value is None or isinstance(value, bytes) or affinity == "BLOB":
+        return value
+
+    if affinity == "TEXT":
+        if isinstance(value, int):
+            return str(value)
+        if isinstance(value, float):
+            if isinf(value):
+                return "Inf" if value > 0 else "-Inf"
+
+            # SQLite's "%!.15g", without negative zero
+            text = f"{value + 0.0:.15g}"
+            if "." not in text and "n" not in text:
+                mantissa, e, exponent = text.partition("e")
+                text = f"{mantissa}.0{e}{exponent}"
+            return text
+        return value
+
+    if isinstance(value, str):
+        if INTEGER_TEXT_PATTERN.fullmatch(value) and MIN_INTEGER <= int(value) <= MAX_INTEGER:
+            value = int(value)
+        elif NUMERIC_TEXT_PATTERN.fullmatch(value):
+            value = float(value)
+        else:
+            return value
+
+    # negative zero is stored as 0.0
+    if affinity == "REAL":
+        return float(value) + 0.0 if isinstance(value, (int, float)) else value
+
+    # INTEGER and NUMERIC keep reals that are whole numbers as integers
+    if isinstance(value, float) and value.is_integer() and MIN_INTEGER <= value <= MAX_INTEGER:
+        return int(value)
+
+    return value
+
 class BaseField():
     """
     Base class for fields intended to be used with SQL databases
@@ -42,6 +119,12 @@ class BaseField():
         self.str_representation = self.create_str_representation()
         return self.str_representation
 
+    def to_stored_value(self, value):
+        """
+        Returns `value` as the database stores it in this field
+        """
+        return value
+
     def set_priority(self, priority: int=None):
         self.priority = int(priority)
 
@@ -51,7 +134,7 @@ class BaseField():
 class SQLiteField(BaseField):
     data_type = None
 
-    def __init__(self, name: str=None, null: bool=False, primary_key: bool=False, attrs: list=[], *args, **kwargs) -> None:
+    def __init__(self, name: str=None, null: bool=False, primary_key: bool=False, attrs: list=[], index: bool=False, unique: bool=False, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
         if self.data_type == None:
@@ -79,6 +162,18 @@ class SQLiteField(BaseField):
         else:
             raise TypeError(f"`primary_key` argument must be a bool, not '{null}'")
 
+
+        if isinstance(index, bool):
+            self.index = index
+        else:
+            raise TypeError(f"`index` argument must be a bool, not '{index}'")
+
+
+        if isinstance(unique, bool):
+            self.unique = unique
+        else:
+            raise TypeError(f"`unique` argument must be a bool, not '{unique}'")
+
         if len(attrs) == 0:
             self.attrs = attrs
 
@@ -106,6 +201,13 @@ class SQLiteField(BaseField):
 
         return rv
 
+    def to_stored_value(self, value):
+        return apply_affinity(value, get_type_affinity(self.data_type))
+
+    def needs_index(self) -> bool:
+        # primary key is already indexed by sqlite
+        return (self.index or self.unique) and not self.primary_key
+
 
 class IntegerFieldSQLite(SQLiteField):
     data_type = "INTEGER"
@@ -129,3 +231,6 @@ class ConstraintField(BaseField):
 
     def create_str_representation(self) -> str:
         return self.constraint
+
+class BlobFieldSQLite(SQLiteField):
+    data_type = "BLOB"
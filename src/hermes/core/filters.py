@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+def get_article_key(values: list) -> bytes:
+    """
+    Returns a short hash of article's identification values
+    """
+
+    return blake2b(repr(tuple(values)).encode(), digest_size=16).digest()
+
+class SeenFilter():
+    """
+    Bounded set of keys of articles that are already stored
+
+    Keys that weren't seen for the longest time are evicted first,
+    so the filter follows the window of articles currently visible on the scraped page
+    """
+
+    def __init__(self, max_size: int=500) -> None:
+        if isinstance(max_size, int) and max_size > 0:
+            self.max_size = max_size
+        else:
+            raise TypeError(f"`max_size` argument must be a positive int, not '{max_size}'")
+
+        self.keys = OrderedDict()
+
+    def add(self, key: bytes) -> None:
+        self.keys[key] = None
+        self.keys.move_to_end(key)
+
+        while len(self.keys) > self.max_size:
+            self.keys.popitem(last=False)
+
+    def __contains__(self, key: bytes) -> bool:
+        if key in self.keys:
+            self.keys.move_to_end(key)
+            return True
+
+        return False
+
+    def __len__(self) -> int:
+        return len(self.keys)
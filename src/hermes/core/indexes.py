@@ -0,0 +1,71 @@
+class BaseIndex():
+    """
+    Base class for indexes intended to be used with SQL databases
+    """
+
+    def __init__(self, fields: list=None, name: str=None, unique: bool=False, where: str=None) -> None:
+
+        if isinstance(fields, list) and len(fields) > 0 and all([isinstance(field, str) for field in fields]):
+            self.fields = fields
+        else:
+            raise TypeError(f"`fields` argument must be a non empty list of field names, not '{fields}'")
+
+
+        if name is None or isinstance(name, str):
+            self.name = name
+        else:
+            raise TypeError(f"`name` argument must be a str, not '{name}'")
+
+
+        if isinstance(unique, bool):
+            self.unique = unique
+        else:
+            raise TypeError(f"`unique` argument must be a bool, not '{unique}'")
+
+
+        if where is None or isinstance(where, str):
+            self.where = where
+        else:
+            raise TypeError(f"`where` argument must be a str, not '{where}'")
+
+        self.str_representation = None
+
+    def get_name(self, table_name: str) -> str:
+        if self.name is not None:
+            return self.name
+
+        return f"{table_name}_{'_'.join(self.fields)}_idx"
+
+    def create_str_representation(self, table_name: str) -> str:
+        """
+        Create and return a string representation of the index
+        """
+
+        raise NotImplementedError()
+
+    def get_index_as_string(self, table_name: str) -> str:
+        """
+        Returns str representation of the index so that it can be directly executed
+
+        Gives something like "CREATE INDEX IF NOT EXISTS name ON table (field)"
+        """
+
+        self.str_representation = self.create_str_representation(table_name)
+        return self.str_representation
+
+class SQLiteIndex(BaseIndex):
+
+    def create_str_representation(self, table_name: str) -> str:
+
+        rv = "CREATE "
+
+        if self.unique:
+            rv += "UNIQUE "
+
+        rv += f"INDEX IF NOT EXISTS {self.get_name(table_name)} ON {table_name} ({', '.join(self.fields)})"
+
+        # partial index, only rows matching the condition are indexed
+        if self.where is not None:
+            rv += f" WHERE {self.where}"
+
+        return rv
@@ -1,12 +1,18 @@
-from smtplib import SMTP
-from ssl import create_default_context
 from email.message import EmailMessage
+from email.policy import SMTP
 from typing import Tuple
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import logging
 
 from hermes.core import notifiers
+from hermes.core.pools import SMTPConnectionPool
 
 from hermes.core.exceptions import SkipReciever
 
+# 8-bit bodies would need BODY=8BITMIME, non-ASCII parts are base64 encoded like with `as_string()`
+SMTP_POLICY = SMTP.clone(cte_type='7bit')
+
 class BaseMailer(notifiers.BaseNotifier):
     """
     Base Mailer class, which all mailers should inherit from
@@ -16,7 +22,9 @@ class BaseMailer(notifiers.BaseNotifier):
         'Subject': 'This is a base title',
     }
 
-    def __init__(self, smtp_port: int=None, smtp_server: str=None, bot_email: str=None, bot_password: str=None, *args, **kwargs) -> None:
+    def __init__(self, smtp_port: int=None, smtp_server: str=None, bot_email: str=None, bot_password: str=None,
+                 smtp_use_tls: bool=True, smtp_connections: int=1, max_messages_per_connection: int=None, max_messages_per_second: float=None,
+                 recipients_per_envelope: int=None, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
         if isinstance(smtp_port, int):
@@ -40,9 +48,30 @@ class BaseMailer(notifiers.BaseNotifier):
             raise NotImplementedError(f"Add `bot_password` attribute, to mailer class, not {type(bot_password)}")
       
 
+        if recipients_per_envelope is None or (isinstance(recipients_per_envelope, int) and recipients_per_envelope > 0):
+            self.recipients_per_envelope = recipients_per_envelope
+        else:
+            raise TypeError(f"`recipients_per_envelope` argument must be a positive int, not '{recipients_per_envelope}'")
+
+        # addresses refused by the server during the last sending, with SMTP codes and messages
+        self.refused_recipients = {}
+
         self.headers = self.DEFAULT_HEADERS
         self.headers['From'] = self.bot_email
 
+        # sessions are reused for all messages, `smtp_connections` of them send in parallel
+        # use smtp_use_tls=False and empty bot_password with a local SMTP stand-in
+        self.connection_pool = SMTPConnectionPool(
+            smtp_server=self.smtp_server,
+            smtp_port=self.smtp_port,
+            bot_email=self.bot_email,
+            bot_password=self.bot_password,
+            use_tls=smtp_use_tls,
+            size=smtp_connections,
+            max_messages_per_connection=max_messages_per_connection,
+            max_messages_per_second=max_messages_per_second,
+        )
+
     def send_notifications(self, articles: list, recievers: list) -> None:
         """
         Handles sending emails
@@ -51,36 +80,95 @@ class BaseMailer(notifiers.BaseNotifier):
 
         articles = self.prepare_articles(articles)
 
-        tls = create_default_context()
-        with SMTP(self.smtp_server, self.smtp_port) as server:
-            server.starttls(context=tls)
-            server.login(self.bot_email, self.bot_password)
-
+        with self.connection_pool as server:
             articles, recievers = self.pre_send(articles, recievers, server)
 
-            ex = None
-            counter = 0
-            try:
-                for email in self.generate_sendable_emails(articles, recievers):                
-                    server.sendmail(self.bot_email, email['To'], email.as_string())
-                    counter += 1
-            except Exception as e:
-                ex = e
+            counter, ex = self.send_emails(server, self.generate_serialized_emails(articles, recievers))
+            self.notifications_sent = counter
 
             raise_exception = self.post_send(ex, counter, articles, recievers, server)
 
             if raise_exception and ex:
                 raise ex
 
-    def pre_send(self, articles: list, recievers: list, server: SMTP) -> Tuple[list, list]:
+    def send_emails(self, server: SMTPConnectionPool, emails) -> Tuple[int, Exception]:
+        """
+        Sends (to_addrs, data) emails over all pooled connections at once,
+        stops at the first failure and waits for emails that are already being sent
+
+        Returns number of recipients that accepted an email and exception that stopped sending (or None),
+        refused recipients are collected in `refused_recipients`
+        """
+
+        counter = 0
+        ex = None
+        in_progress = set()
+        self.refused_recipients = {}
+
+        def collect(done: set) -> None:
+            nonlocal counter, ex
+
+            for future in done:
+                if future.exception() is None:
+                    accepted, refused = future.result()
+                    counter += accepted
+                    self.refused_recipients.update(refused)
+                elif ex is None:
+                    ex = future.exception()
+
+        with ThreadPoolExecutor(max_workers=server.size, thread_name_prefix="hermes-smtp") as executor:
+            try:
+                for to_addrs, data in emails:
+                    in_progress.add(executor.submit(self.send_email, server, to_addrs, data))
+
+                    # don't buffer the whole mailing list in memory
+                    if len(in_progress) >= server.size * 2:
+                        done, in_progress = wait(in_progress, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+                        if ex is not None:
+                            break
+            except Exception as e:
+                ex = e
+
+            done, in_progress = wait(in_progress)
+            collect(done)
+
+        if len(self.refused_recipients) > 0:
+            logging.warning(f"{type(self).__name__} - {len(self.refused_recipients)} recipients refused: {self.refused_recipients}")
+
+        return counter, ex
+
+    def send_email(self, server: SMTPConnectionPool, to_addrs, data) -> Tuple[int, dict]:
+        """
+        Sends one SMTP transaction, returns number of recipients that accepted it and refused ones
+        """
+
+        from smtplib import SMTPRecipientsRefused
+
+        if isinstance(to_addrs, str):
+            to_addrs = [to_addrs]
+
+        try:
+            refused = server.sendmail(self.bot_email, to_addrs, data)
+        except SMTPRecipientsRefused as e:
+            # a bad address shouldn't stop sending to everyone else
+            refused = e.recipients
+
+        return len(to_addrs) - len(refused), refused
+
+    def pre_send(self, articles: list, recievers: list, server: SMTPConnectionPool) -> Tuple[list, list]:
         """
         Executes before sending emails
+
+        `server` is the connection pool, not an smtplib.SMTP session, it has `sendmail` and `send_message`,
+        other SMTP commands go through a borrowed session: `with server.session() as smtp: smtp.noop()`
         """
         return articles, recievers
 
-    def post_send(self, ex: Exception, num_emails_sent: int, articles: list, recievers: list, server: SMTP) -> bool:
+    def post_send(self, ex: Exception, num_emails_sent: int, articles: list, recievers: list, server: SMTPConnectionPool) -> bool:
         """
-        Executes after sending emails 
+        Executes after sending emails, `server` is the connection pool like in `pre_send`
         """
         return True
 
@@ -92,6 +180,110 @@ class BaseMailer(notifiers.BaseNotifier):
         return articles
 
 
+    def generate_serialized_emails(self, articles: list, recievers: list):
+        """
+        Generator function, yields (to_addrs, data) tuples ready to be passed to sendmail
+
+        Unless the mailer edits messages, message is serialized once per profile key
+        and only per-receiver headers are prepended to the ready bytes,
+        with `recipients_per_envelope` set receivers of one profile are sent together as a list of addresses
+        """
+
+        if not self.uses_message_templates():
+            for email in self.generate_sendable_emails(articles, recievers):
+                # message has to be serialized here, the generator reuses one EmailMessage object
+                yield email['To'], email.as_string()
+            return
+
+        base_content = self.get_message_base_content()
+
+        headers = {name: value for name, value in self.get_mailer_headers().items() if name != 'To'}
+
+        # serialized messages without per-receiver headers, by receiver profile key
+        templates = {}
+
+        # addresses waiting to be sent in one envelope, by receiver profile key
+        batches = {}
+
+        for reciever in recievers:
+            try:
+                template = self.get_message_template(articles, reciever, base_content, headers, templates)
+            except SkipReciever as e:
+                continue
+
+            profile_key = self.get_profile_key(reciever)
+            if self.batches_recipients() and profile_key is not None:
+                batch = batches.setdefault(profile_key, [])
+                batch.append(reciever['address'])
+
+                if len(batch) >= self.recipients_per_envelope:
+                    yield batch, self.get_batch_headers() + template
+                    batches[profile_key] = []
+
+                continue
+
+            personal_headers = {'To': reciever['address'], **self.get_personal_headers(reciever)}
+            data = b"".join([SMTP_POLICY.fold_binary(name, SMTP_POLICY.header_factory(name, value)) for name, value in personal_headers.items()])
+
+            yield reciever['address'], data + template
+
+        for profile_key, batch in batches.items():
+            if len(batch) > 0:
+                yield batch, self.get_batch_headers() + templates[profile_key]
+
+    def batches_recipients(self) -> bool:
+        """
+        Checks if receivers with the same profile key can share one SMTP transaction,
+        it's opt-in with `recipients_per_envelope` and impossible when messages are personalised
+        """
+
+        if self.recipients_per_envelope is None or self.recipients_per_envelope < 2:
+            return False
+
+        return self.uses_message_templates() and type(self).get_personal_headers is BaseMailer.get_personal_headers
+
+    def get_batch_headers(self) -> bytes:
+        # recipients of a batch are only in the envelope, like Bcc
+        return SMTP_POLICY.fold_binary('To', SMTP_POLICY.header_factory('To', 'undisclosed-recipients:;'))
+
+    def get_message_template(self, articles: list, reciever: dict, base_content: str, headers: dict, templates: dict) -> bytes:
+        """
+        Returns serialized message without per-receiver headers,
+        it's built only once for all receivers with the same profile key
+        """
+
+        profile_key = self.get_profile_key(reciever)
+
+        if profile_key is not None and profile_key in templates:
+            return templates[profile_key]
+
+        msg = EmailMessage()
+        msg = self.add_or_replace_message_headers(msg, headers)
+
+        msg.make_alternative()
+        msg.attach(self.get_message_part(articles, reciever, base_content, {}))
+
+        template = msg.as_bytes(policy=SMTP_POLICY)
+
+        if profile_key is not None:
+            templates[profile_key] = template
+
+        return template
+
+    def uses_message_templates(self) -> bool:
+        """
+        Checks if messages can be serialized once and reused,
+        not possible when the mailer customizes EmailMessage objects
+        """
+        return not self.edits_message() and type(self).generate_sendable_emails is BaseMailer.generate_sendable_emails
+
+    def get_personal_headers(self, reciever: dict) -> dict:
+        """
+        Optional function, returns headers added to the message of this receiver only (besides `To`),
+        they shouldn't repeat any of the mailer headers
+        """
+        return {}
+
     def generate_sendable_emails(self, articles: list, recievers: list) -> EmailMessage:
         """
         Generator function, constructs EmailMessage with all content
@@ -106,14 +298,17 @@ class BaseMailer(notifiers.BaseNotifier):
         msg = self.add_or_replace_message_headers(msg, headers)
 
 
+        # rendered html parts, by receiver profile key
+        parts_cache = {}
+
         for reciever in recievers:
             msg.clear_content()
             msg = self.add_or_replace_message_headers(msg, {'To': reciever['address']})
             
             try:
-                body = self.get_message_body(articles, reciever)
-                content = base_content.format(body)
-                msg.add_alternative(content, subtype='html')
+                part = self.get_message_part(articles, reciever, base_content, parts_cache)
+                msg.make_alternative()
+                msg.attach(part)
 
                 msg = self.edit_message(msg, articles, reciever)
             except SkipReciever as e:
@@ -121,6 +316,51 @@ class BaseMailer(notifiers.BaseNotifier):
 
             yield msg
 
+    def get_message_part(self, articles: list, reciever: dict, base_content: str, parts_cache: dict) -> EmailMessage:
+        """
+        Returns html part of the message,
+        it's rendered only once for all receivers with the same profile key
+        """
+
+        profile_key = self.get_profile_key(reciever)
+
+        if profile_key is not None and profile_key in parts_cache:
+            return self.reuse_message_part(parts_cache[profile_key])
+
+        body = self.get_message_body(articles, reciever)
+        content = base_content.format(body)
+
+        part = EmailMessage()
+        part.set_content(content, subtype='html')
+
+        if profile_key is not None:
+            parts_cache[profile_key] = part
+            return self.reuse_message_part(part)
+
+        return part
+
+    def reuse_message_part(self, part: EmailMessage) -> EmailMessage:
+        # overridden edit_message could change the cached part in place, give it a copy
+        if self.edits_message():
+            return deepcopy(part)
+
+        return part
+
+    def edits_message(self) -> bool:
+        """
+        Checks if this mailer overrides edit_message
+        """
+        return type(self).edit_message is not BaseMailer.edit_message
+
+    def get_profile_key(self, reciever: dict):
+        """
+        Optional function, receivers with the same (hashable) profile key must get identical message body,
+        body is then rendered only once per profile
+
+        None means the body is rendered separately for this receiver
+        """
+        return None
+
     def add_or_replace_message_headers(self, msg: EmailMessage, headers: dict) -> EmailMessage:
         for header in headers.items():
             if header[0] in msg.keys():
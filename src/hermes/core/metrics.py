@@ -0,0 +1,254 @@
+import json
+import os
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import PurePath
+from threading import Lock
+from time import perf_counter, time
+
+# upper bounds of latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Histogram():
+    def __init__(self, buckets: tuple=DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+
+        # not cumulative, the last one counts values above the highest bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def get_cumulative_counts(self) -> list:
+        """
+        Returns (upper bound, number of values <= upper bound) tuples, the last bound is +Inf
+        """
+
+        rv = []
+        total = 0
+        for bound, count in zip([*self.buckets, float('inf')], self.counts):
+            total += count
+            rv.append((bound, total))
+
+        return rv
+
+class BaseMetricsHook():
+    """
+    Base class for metrics hooks, hooks are notified about every recorded metric,
+    add them to METRICS_HOOKS in settings
+    """
+
+    def phase_finished(self, phase: str, seconds: float, labels: dict) -> None:
+        """
+        Executes after a phase (fetch, parse, store, get_new, notify, mark_old or the whole run) finishes
+        """
+        pass
+
+    def counted(self, name: str, value: float, labels: dict) -> None:
+        """
+        Executes after a counter (bytes_downloaded, items_parsed, items_new, notifications_sent) is increased
+        """
+        pass
+
+    def run_finished(self, metrics: "Metrics") -> None:
+        """
+        Executes at the end of every run
+        """
+        pass
+
+class Metrics():
+    """
+    Collects timings of pipeline phases and counters, labelled by scraper or notifier,
+    values are kept for the whole lifetime of the app so with `serve` they cover all runs
+    """
+
+    def __init__(self, hooks: list=None, buckets: tuple=DEFAULT_BUCKETS) -> None:
+        if hooks is None:
+            hooks = []
+
+        if not isinstance(hooks, list) or not all(isinstance(hook, BaseMetricsHook) for hook in hooks):
+            raise TypeError(f"`hooks` argument must be a list of {BaseMetricsHook} objects")
+
+        self.hooks = hooks
+        self.buckets = buckets
+
+        # by (phase or counter name, sorted label items)
+        self.histograms = {}
+        self.counters = {}
+
+        # totals of the current run, by phase or counter name
+        self.run_phases = {}
+        self.run_counters = {}
+
+        self.lock = Lock()
+
+    @staticmethod
+    def get_key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, phase: str, seconds: float, **labels) -> None:
+        key = self.get_key(phase, labels)
+
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(self.buckets)
+            self.histograms[key].observe(seconds)
+            self.run_phases[phase] = self.run_phases.get(phase, 0.0) + seconds
+
+        for hook in self.hooks:
+            hook.phase_finished(phase, seconds, labels)
+
+    def count(self, name: str, value: float=1, **labels) -> None:
+        key = self.get_key(name, labels)
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.run_counters[name] = self.run_counters.get(name, 0) + value
+
+        for hook in self.hooks:
+            hook.counted(name, value, labels)
+
+    @contextmanager
+    def measure(self, phase: str, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, perf_counter() - start, **labels)
+
+    def measure_iter(self, phase: str, iterable, count_name: str=None, **labels):
+        """
+        Generator function, yields from `iterable` timing only the time spent getting items,
+        the total is recorded once the generator is exhausted or closed
+        """
+
+        iterator = iter(iterable)
+        seconds = 0.0
+        num_items = 0
+
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += perf_counter() - start
+
+                num_items += 1
+                yield item
+        finally:
+            self.observe(phase, seconds, **labels)
+            if count_name is not None:
+                self.count(count_name, num_items, **labels)
+
+    def start_run(self) -> None:
+        with self.lock:
+            self.run_phases = {}
+            self.run_counters = {}
+
+    def finish_run(self) -> None:
+        for hook in self.hooks:
+            hook.run_finished(self)
+
+    def as_dict(self) -> dict:
+        with self.lock:
+            return {
+                "timestamp": time(),
+                "phases": [
+                    {
+                        "phase": phase,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": [[str(bound), count] for bound, count in histogram.get_cumulative_counts()],
+                    }
+                    for (phase, labels), histogram in self.histograms.items()
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "last_run": {"phases": dict(self.run_phases), "counters": dict(self.run_counters)},
+            }
+
+    def as_prometheus_text(self, prefix: str="hermes") -> str:
+        """
+        Returns metrics in Prometheus text exposition format
+        """
+
+        def format_labels(labels: tuple) -> str:
+            if len(labels) == 0:
+                return ''
+
+            escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in labels]
+            return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+        lines = []
+        with self.lock:
+            name = f"{prefix}_phase_duration_seconds"
+            lines.append(f"# HELP {name} Time spent in pipeline phases")
+            lines.append(f"# TYPE {name} histogram")
+
+            for (phase, labels), histogram in self.histograms.items():
+                labels = (("phase", phase), *labels)
+
+                for bound, count in histogram.get_cumulative_counts():
+                    le = "+Inf" if bound == float('inf') else str(bound)
+                    lines.append(f"{name}_bucket{format_labels((*labels, ('le', le)))} {count}")
+
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+
+            counter_names = sorted(set(counter_name for counter_name, labels in self.counters))
+            for counter_name in counter_names:
+                name = f"{prefix}_{counter_name}_total"
+                lines.append(f"# TYPE {name} counter")
+
+                for (other_name, labels), value in self.counters.items():
+                    if other_name == counter_name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+def write_atomically(path: PurePath, content: str) -> None:
+    # readers (e.g. node_exporter's textfile collector) never see a half written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+class JSONMetricsExporter(BaseMetricsHook):
+    """
+    Writes all metrics to a JSON file after every run
+    """
+
+    def __init__(self, path: PurePath=None) -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+    def run_finished(self, metrics: Metrics) -> None:
+        write_atomically(self.path, json.dumps(metrics.as_dict(), indent=4))
+
+class PrometheusTextfileExporter(BaseMetricsHook):
+    """
+    Writes all metrics to a .prom file after every run, for node_exporter's textfile collector
+    """
+
+    def __init__(self, path: PurePath=None, prefix: str="hermes") -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+        self.prefix = prefix
+
+    def run_finished(self, metrics: Metrics) -> None:
+        write_atomically(self.path, metrics.as_prometheus_text(self.prefix))
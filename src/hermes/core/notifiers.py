@@ -1,6 +1,6 @@
-import json
 from typing import Tuple
 from hermes.core.exceptions import NoNewArticles
+from hermes.core.receivers import BaseReceiverSource, JSONReceiverSource, get_receiver_source
 from pathlib import PurePath
 
 class BaseNotifier():
@@ -8,16 +8,30 @@ class BaseNotifier():
     Base Notifier class which all notifiers should inherit from
     """
 
-    def __init__(self, receivers_path: str=None) -> None:
+    def __init__(self, receivers_path: str=None, receiver_source: BaseReceiverSource=None, name: str=None) -> None:
         self.articles = None
+        self.name = name
         self.receivers = None
+
+        # id of the run that found the articles, see BaseStorage.get_run_articles
+        self.run_id = None
+
+        # how many receivers got the last notification, reported as `notifications_sent` metric
+        self.notifications_sent = 0
         
-        if isinstance(receivers_path, PurePath):
+        if isinstance(receiver_source, BaseReceiverSource):
+            self.receivers_path = None
+            self.receiver_source = receiver_source
+        elif isinstance(receivers_path, PurePath):
+            # .json, .jsonl/.ndjson or .db/.sqlite3
             self.receivers_path = receivers_path
+            self.receiver_source = get_receiver_source(receivers_path)
         else:
             raise NotImplementedError(f"Add `receivers_path` type {PurePath} argument, not {type(receivers_path)}")
 
     def notify(self) -> None:
+        self.notifications_sent = 0
+
         articles = self.get_articles()
         receivers = self.get_receivers()
         
@@ -56,21 +70,43 @@ class BaseNotifier():
         else:
             raise TypeError("`articles` must be a list")
 
+    def get_name(self) -> str:
+        """
+        Identifies the notifier between runs, the storage keeps the last run each notifier delivered under this name,
+        set `name` to tell apart notifiers of the same class that read the same receivers
+        """
+
+        if self.name is not None:
+            return self.name
+
+        if self.receivers_path is not None:
+            return f"{type(self).__name__}({self.receivers_path.name})"
+
+        return type(self).__name__
+
+    def set_run_id(self, run_id: int) -> None:
+        self.run_id = run_id
+
     def get_articles(self):
         if self.articles:
             return self.articles
         else:
             raise NoNewArticles("No new articles or articles have not been set")
     
-    def read_receivers_from_json(self, json_path: str=None) -> None:
-        if json_path == None and self.receivers_path is not None:
-            json_path = self.receivers_path
-        else:
-            raise NotImplementedError("`json_path` must be set at some point before reading file")
+    def read_receivers(self):
+        """
+        Loads receivers from the receiver source,
+        for streaming sources `receivers` is the source itself and receivers are read while notifying
+        """
 
-        with open(json_path, 'r') as f:
-            self.receivers = json.load(f)
-            return self.receivers
+        self.receivers = self.receiver_source.load()
+        return self.receivers
+
+    def read_receivers_from_json(self, json_path: str=None):
+        if json_path is not None:
+            self.receiver_source = JSONReceiverSource(json_path)
+
+        return self.read_receivers()
 
     def get_receivers(self) -> list:
         if self.receivers:
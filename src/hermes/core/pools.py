@@ -0,0 +1,195 @@
+from contextlib import contextmanager
+from threading import Lock, Condition
+from time import monotonic, sleep
+from typing import TYPE_CHECKING
+
+# smtplib and ssl are imported only when the first connection is made
+if TYPE_CHECKING:
+    from smtplib import SMTP
+
+class RateLimiter():
+    """
+    Spaces calls evenly so that there are at most `max_per_second` of them, shared between threads
+    """
+
+    def __init__(self, max_per_second: float=None) -> None:
+        if max_per_second is None or (isinstance(max_per_second, (int, float)) and max_per_second > 0):
+            self.max_per_second = max_per_second
+        else:
+            raise TypeError(f"`max_per_second` argument must be a positive number, not '{max_per_second}'")
+
+        self.next_time = 0
+        self.lock = Lock()
+
+    def wait(self) -> None:
+        if self.max_per_second is None:
+            return
+
+        with self.lock:
+            now = monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + 1 / self.max_per_second
+
+        if wait_time > 0:
+            sleep(wait_time)
+
+class SMTPConnectionPool():
+    """
+    Pool of authenticated SMTP sessions, can be shared by many sending threads
+
+    Sessions are opened lazily, replaced after `max_messages_per_connection` messages
+    and reopened transparently when the server drops them
+    """
+
+    def __init__(self, smtp_server: str=None, smtp_port: int=None, bot_email: str=None, bot_password: str=None,
+                 use_tls: bool=True, size: int=1, max_messages_per_connection: int=None, max_messages_per_second: float=None) -> None:
+
+        self.smtp_server = smtp_server
+        self.smtp_port = smtp_port
+        self.bot_email = bot_email
+        self.bot_password = bot_password
+        self.use_tls = use_tls
+
+        if isinstance(size, int) and size > 0:
+            self.size = size
+        else:
+            raise TypeError(f"`size` argument must be a positive int, not '{size}'")
+
+        if max_messages_per_connection is None or (isinstance(max_messages_per_connection, int) and max_messages_per_connection > 0):
+            self.max_messages_per_connection = max_messages_per_connection
+        else:
+            raise TypeError(f"`max_messages_per_connection` argument must be a positive int, not '{max_messages_per_connection}'")
+
+        self.rate_limiter = RateLimiter(max_messages_per_second)
+
+        # idle sessions as [server, number of messages sent] lists, None for slots that aren't connected
+        self.idle = [None for i in range(self.size)]
+        self.condition = Condition()
+
+    def connect(self) -> "SMTP":
+        from smtplib import SMTP
+        from ssl import create_default_context
+
+        server = SMTP(self.smtp_server, self.smtp_port)
+
+        if self.use_tls:
+            server.starttls(context=create_default_context())
+
+        # local stand-ins usually don't support AUTH
+        if self.bot_password:
+            server.login(self.bot_email, self.bot_password)
+
+        return server
+
+    def acquire(self) -> list:
+        with self.condition:
+            while len(self.idle) == 0:
+                self.condition.wait()
+
+            session = self.idle.pop()
+
+        if session is None:
+            try:
+                session = [self.connect(), 0]
+            except Exception:
+                self.release(None)
+                raise
+
+        return session
+
+    def release(self, session: list) -> None:
+        with self.condition:
+            self.idle.append(session)
+            self.condition.notify()
+
+    def close_session(self, session: list) -> None:
+        try:
+            session[0].quit()
+        except Exception:
+            session[0].close()
+
+    def is_disconnect(self, e: Exception) -> bool:
+        from smtplib import SMTPServerDisconnected, SMTPResponseException
+
+        if isinstance(e, (SMTPServerDisconnected, ConnectionError)):
+            return True
+
+        # 421 - service closing the channel
+        return isinstance(e, SMTPResponseException) and e.smtp_code == 421
+
+    def sendmail(self, from_addr: str, to_addrs, msg) -> dict:
+        """
+        Sends message using one of the pooled sessions, same as SMTP.sendmail
+        """
+        return self.send("sendmail", from_addr, to_addrs, msg)
+
+    def send_message(self, msg, from_addr: str=None, to_addrs=None, **kwargs) -> dict:
+        """
+        Sends EmailMessage using one of the pooled sessions, same as SMTP.send_message
+        """
+        return self.send("send_message", msg, from_addr, to_addrs, **kwargs)
+
+    def send(self, method: str, *args, **kwargs) -> dict:
+        """
+        Calls sending `method` of one of the pooled sessions, counts the message towards `max_messages_per_connection`
+        """
+
+        self.rate_limiter.wait()
+
+        session = self.acquire()
+        try:
+            try:
+                refused = getattr(session[0], method)(*args, **kwargs)
+            except Exception as e:
+                if not self.is_disconnect(e):
+                    raise
+
+                # session dropped by the server e.g. after idle timeout, retry once on a fresh one
+                session[0].close()
+                session = None
+                session = [self.connect(), 0]
+                refused = getattr(session[0], method)(*args, **kwargs)
+
+            session[1] += 1
+            if self.max_messages_per_connection is not None and session[1] >= self.max_messages_per_connection:
+                self.close_session(session)
+                session = None
+
+            return refused
+        except Exception as e:
+            if session is not None and self.is_disconnect(e):
+                session[0].close()
+                session = None
+            raise
+        finally:
+            self.release(session)
+
+    @contextmanager
+    def session(self):
+        """
+        Context manager lending one of the pooled smtplib.SMTP sessions, for anything else than sending (e.g. `noop`)
+        """
+
+        session = self.acquire()
+        try:
+            yield session[0]
+        except Exception as e:
+            if self.is_disconnect(e):
+                session[0].close()
+                session = None
+            raise
+        finally:
+            self.release(session)
+
+    def close(self) -> None:
+        with self.condition:
+            for i, session in enumerate(self.idle):
+                if session is not None:
+                    self.close_session(session)
+                    self.idle[i] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
@@ -0,0 +1,150 @@
+import re
+import sqlite3
+from math import ceil
+from time import perf_counter
+
+class QueryStats():
+    def __init__(self) -> None:
+        self.times = []
+        self.rows = 0
+
+    @property
+    def calls(self) -> int:
+        return len(self.times)
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.times)
+
+    @property
+    def p95_time(self) -> float:
+        times = sorted(self.times)
+        return times[max(ceil(len(times) * 0.95) - 1, 0)]
+
+class QueryProfiler():
+    """
+    Aggregates time and rows of SQL statements by their fingerprint,
+    statements that differ only in values (literals, number of placeholders) share one fingerprint
+    """
+
+    STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+    NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+    PLACEHOLDER_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+    WHITESPACE_PATTERN = re.compile(r"\s+")
+
+    def __init__(self) -> None:
+        self.stats = {}
+
+    def get_fingerprint(self, sql: str) -> str:
+        sql = self.STRING_PATTERN.sub("?", sql)
+        sql = self.NUMBER_PATTERN.sub("?", sql)
+        sql = self.PLACEHOLDER_LIST_PATTERN.sub("(?+)", sql)
+        return self.WHITESPACE_PATTERN.sub(" ", sql).strip().rstrip(";")
+
+    def record(self, sql: str, seconds: float, rows: int=0) -> QueryStats:
+        fingerprint = self.get_fingerprint(sql)
+
+        if fingerprint not in self.stats:
+            self.stats[fingerprint] = QueryStats()
+
+        stats = self.stats[fingerprint]
+        stats.times.append(seconds)
+        stats.rows += rows
+
+        return stats
+
+    def reset(self) -> None:
+        self.stats = {}
+
+    def get_report(self, limit: int=20, max_statement_length: int=120) -> str:
+        """
+        Returns a table of the `limit` most time consuming statements
+        """
+
+        total_time = sum(stats.total_time for stats in self.stats.values())
+        total_calls = sum(stats.calls for stats in self.stats.values())
+
+        lines = [
+            f"SQL profile: {total_calls} calls of {len(self.stats)} statements, {total_time * 1000:.1f} ms",
+            f"{'calls':>8} {'total ms':>10} {'p95 ms':>8} {'rows':>8}  statement",
+        ]
+
+        by_time = sorted(self.stats.items(), key=lambda item: item[1].total_time, reverse=True)
+        for fingerprint, stats in by_time[:limit]:
+            if len(fingerprint) > max_statement_length:
+                fingerprint = fingerprint[:max_statement_length - 3] + "..."
+
+            lines.append(f"{stats.calls:>8} {stats.total_time * 1000:>10.2f} {stats.p95_time * 1000:>8.2f} {stats.rows:>8}  {fingerprint}")
+
+        return '\n'.join(lines)
+
+class ProfilingCursor(sqlite3.Cursor):
+    """
+    Times statements and counts rows they return (or change),
+    time spent fetching rows is added to the statement that returned them
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.last_stats = None
+
+    def profile(self, method, sql: str, *args):
+        start = perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            seconds = perf_counter() - start
+
+            # -1 for SELECT, its rows are counted while fetching
+            self.last_stats = self.connection.profiler.record(sql, seconds, max(self.rowcount, 0))
+
+    def profile_fetch(self, method, *args):
+        start = perf_counter()
+        rv = method(*args)
+        seconds = perf_counter() - start
+
+        if self.last_stats is not None:
+            self.last_stats.times[-1] += seconds
+
+            if isinstance(rv, list):
+                self.last_stats.rows += len(rv)
+            elif rv is not None:
+                self.last_stats.rows += 1
+
+        return rv
+
+    def execute(self, sql: str, parameters=()):
+        return self.profile(super().execute, sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters):
+        return self.profile(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script: str):
+        return self.profile(super().executescript, sql_script)
+
+    def fetchone(self):
+        return self.profile_fetch(super().fetchone)
+
+    def fetchmany(self, size: int=None):
+        if size is None:
+            size = self.arraysize
+        return self.profile_fetch(super().fetchmany, size)
+
+    def fetchall(self):
+        return self.profile_fetch(super().fetchall)
+
+    def __next__(self):
+        row = self.profile_fetch(super().fetchone)
+        if row is None:
+            raise StopIteration
+        return row
+
+class ProfilingConnection(sqlite3.Connection):
+    """
+    Connection which profiles every statement with `profiler`, use as `sqlite3.connect` factory
+    """
+
+    profiler = None
+
+    def cursor(self, factory=ProfilingCursor):
+        return super().cursor(factory)
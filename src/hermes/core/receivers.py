@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+from pathlib import Path, PurePath
+
+from hermes.core import fields, tables
+
+class BaseReceiverSource():
+    """
+    Base class for sources of notification receivers (dicts with at least `address` key)
+
+    Sources are iterables, notifiers go through receivers without keeping them all in memory
+    """
+
+    def iter_receivers(self):
+        raise NotImplementedError()
+
+    def iter_chunks(self, chunk_size: int=1000):
+        """
+        Generator function, yields lists of at most `chunk_size` receivers
+        """
+
+        chunk = []
+        for receiver in self.iter_receivers():
+            chunk.append(receiver)
+
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+
+        if len(chunk) > 0:
+            yield chunk
+
+    def load(self):
+        """
+        Returns receivers in a form that can be iterated over many times
+        """
+        return self
+
+    def __iter__(self):
+        return self.iter_receivers()
+
+    def __bool__(self) -> bool:
+        # only the first receiver is read
+        for receiver in self.iter_receivers():
+            return True
+        return False
+
+class JSONReceiverSource(BaseReceiverSource):
+    """
+    Reads a JSON file with a list of receivers, the file is parsed again only when it changes
+    """
+
+    def __init__(self, path: PurePath=None) -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+        self.receivers = None
+        self.file_signature = None
+
+    def load(self) -> list:
+        stat = os.stat(self.path)
+        file_signature = (stat.st_mtime_ns, stat.st_size)
+
+        if self.receivers is None or file_signature != self.file_signature:
+            with open(self.path, 'r') as f:
+                self.receivers = json.load(f)
+            self.file_signature = file_signature
+
+        return self.receivers
+
+    def iter_receivers(self):
+        return iter(self.load())
+
+class JSONLinesReceiverSource(BaseReceiverSource):
+    """
+    Streams receivers from a JSON Lines file, one JSON object per line
+    """
+
+    def __init__(self, path: PurePath=None) -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+    def iter_receivers(self):
+        with open(self.path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+class SQLiteReceiverSource(BaseReceiverSource):
+    """
+    Keeps receivers in a SQLite table and reads them in chunks,
+    receiver's keys other than `address` are stored as JSON
+    """
+
+    def __init__(self, path: PurePath=None, table_name: str="Receivers", chunk_size: int=1000) -> None:
+        if isinstance(path, PurePath):
+            self.path = path
+        else:
+            raise TypeError(f"`path` argument must be a {PurePath}, not {type(path)}")
+
+        if isinstance(chunk_size, int) and chunk_size > 0:
+            self.chunk_size = chunk_size
+        else:
+            raise TypeError(f"`chunk_size` argument must be a positive int, not '{chunk_size}'")
+
+        self.table = tables.BaseTable(name=table_name, fields=[
+            fields.IntegerFieldSQLite(name="receiver_id", primary_key=True),
+            fields.TextFieldSQLite(name="address", null=False, use_to_identify=True),
+            fields.TextFieldSQLite(name="data", null=True),
+        ])
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path))
+        conn.row_factory = sqlite3.Row
+
+        schema = self.table.compile()
+        conn.execute(schema.create_sql)
+        for index in schema.indexes:
+            conn.execute(index.get_index_as_string(self.table.name))
+
+        return conn
+
+    def add_receivers(self, receivers) -> None:
+        """
+        Inserts or updates receivers, e.g. to import them from another source
+        """
+
+        def to_row(receiver: dict) -> tuple:
+            data = {key: value for key, value in receiver.items() if key != 'address'}
+            return receiver['address'], json.dumps(data)
+
+        conn = self.connect()
+        try:
+            with conn:
+                # insert columns are (address, data)
+                conn.executemany(self.table.compile().upsert_sql, (to_row(receiver) for receiver in receivers))
+        finally:
+            conn.close()
+
+    def iter_chunks(self, chunk_size: int=None):
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+
+        pk = self.table.get_primary_key_field()
+
+        conn = self.connect()
+        try:
+            last_id = 0
+            while True:
+                # keyset pagination, every chunk is an index range scan
+                c = conn.execute(f"SELECT * FROM {self.table.name} WHERE {pk.name}>? ORDER BY {pk.name} LIMIT ?", (last_id, chunk_size))
+                rows = c.fetchall()
+
+                if len(rows) == 0:
+                    return
+
+                last_id = rows[-1][pk.name]
+                yield [{'address': row['address'], **json.loads(row['data'] or '{}')} for row in rows]
+        finally:
+            conn.close()
+
+    def iter_receivers(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+def get_receiver_source(path: PurePath) -> BaseReceiverSource:
+    """
+    Picks a receiver source by file extension
+    """
+
+    suffix = Path(path).suffix.lower()
+
+    if suffix in ('.jsonl', '.ndjson'):
+        return JSONLinesReceiverSource(path)
+    elif suffix in ('.db', '.sqlite', '.sqlite3'):
+        return SQLiteReceiverSource(path)
+    else:
+        return JSONReceiverSource(path)
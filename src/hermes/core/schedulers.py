@@ -0,0 +1,80 @@
+import heapq
+from random import uniform
+from time import monotonic
+
+class AdaptiveScheduler():
+    """
+    Decides when each scraper should be polled next
+
+    Every scraper has its own interval, it gets shorter when the scraper finds new articles
+    and longer when it doesn't, so quiet sources are polled less often than busy ones
+    """
+
+    def __init__(self, scrapers: list=None, default_interval: float=900, min_interval: float=60, max_interval: float=21600,
+                 jitter: float=0.1, speedup: float=0.5, slowdown: float=1.5) -> None:
+
+        if not isinstance(scrapers, list):
+            raise TypeError("`scrapers` argument must be a list of scrapers")
+
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("Intervals must satisfy 0 < `min_interval` <= `max_interval`")
+
+        if not 0 <= jitter < 1:
+            raise ValueError(f"`jitter` argument must be a fraction between 0 and 1, not '{jitter}'")
+
+        self.scrapers = scrapers
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.speedup = speedup
+        self.slowdown = slowdown
+
+        # intervals and heap entries refer to scrapers by their position in `scrapers`
+        self.intervals = []
+        self.queue = []
+
+        now = monotonic()
+        for i, scraper in enumerate(scrapers):
+            interval = scraper.poll_interval if scraper.poll_interval is not None else default_interval
+            self.intervals.append(self.clamp(interval))
+
+            # first polls are spread over the first `jitter` fraction of the interval instead of all happening at once
+            heapq.heappush(self.queue, (now + uniform(0, self.jitter) * self.intervals[i], i))
+
+    def clamp(self, interval: float) -> float:
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def get_time_until_next(self) -> float:
+        if len(self.queue) == 0:
+            return self.max_interval
+
+        return max(0, self.queue[0][0] - monotonic())
+
+    def pop_due(self) -> list:
+        """
+        Returns scrapers that should be polled now, they have to be rescheduled afterwards
+        """
+
+        rv = []
+        now = monotonic()
+
+        while len(self.queue) > 0 and self.queue[0][0] <= now:
+            due_time, i = heapq.heappop(self.queue)
+            rv.append(self.scrapers[i])
+
+        return rv
+
+    def reschedule(self, scraper, changed: bool) -> None:
+        i = self.scrapers.index(scraper)
+
+        if changed:
+            self.intervals[i] = self.clamp(self.intervals[i] * self.speedup)
+        else:
+            self.intervals[i] = self.clamp(self.intervals[i] * self.slowdown)
+
+        # jitter keeps scrapers of one host from synchronizing
+        interval = self.intervals[i] * uniform(1 - self.jitter, 1 + self.jitter)
+        heapq.heappush(self.queue, (monotonic() + interval, i))
+
+    def get_interval(self, scraper) -> float:
+        return self.intervals[self.scrapers.index(scraper)]
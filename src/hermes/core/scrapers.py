@@ -1,5 +1,16 @@
-import requests
+import json
+import re
 from time import ctime
+from hashlib import sha256
+from threading import Lock
+from urllib.parse import urlparse
+from typing import TYPE_CHECKING
+
+from hermes.core.exceptions import PageNotModified
+
+# requests is imported only when the first session is created, it slows down startup of every manage.py action
+if TYPE_CHECKING:
+    import requests
 
 class BaseScraper():
     """
@@ -10,6 +21,42 @@ class BaseScraper():
     name = None
     verbose_name = None
 
+    # overrides MAX_ARTICLES from settings for this scraper
+    max_items = None
+
+    # stop consuming scraped articles after this many known ones in a row, overrides STOP_AFTER_KNOWN from settings
+    stop_after_known = None
+
+    # number of listing pages to go through, `url` and the ones from `get_page_urls`,
+    # going deeper stops at the first page without new articles
+    max_pages = 1
+
+    # how many of the following pages are fetched at once, overrides MAX_CONCURRENT_PAGES from settings
+    max_concurrent_pages = None
+
+    # initial poll interval in seconds when running as a daemon, overrides POLL_INTERVAL from settings
+    poll_interval = None
+
+    # override storage's RETENTION_DAYS and RETENTION_KEEP_LAST for this scraper's articles
+    retention_days = None
+    retention_keep_last = None
+
+    # send If-None-Match/If-Modified-Since and raise PageNotModified on 304
+    use_http_cache = True
+
+    # skip parsing and storing when the page's fingerprint didn't change since the last run
+    use_fingerprint = True
+
+    # strip markup that changes on every request (scripts, styles, comments, whitespace) before hashing
+    normalize_fingerprint = True
+
+    # max number of kept-alive connections per host
+    SESSION_POOL_SIZE = 10
+
+    # sessions are shared between all scrapers, one per host
+    _sessions = {}
+    _sessions_lock = Lock()
+
     def __init__(self, url: str=None) -> None:
         if self.name == None:
             raise NotImplementedError("Add `name` attribute, to scraper class")
@@ -32,15 +79,75 @@ class BaseScraper():
         self.cookies = {
         }
 
+        # validators of the last stored response, by url
+        self.http_cache = {}
+
+        # validators of fetched responses, by url, they move to `http_cache` with `commit_http_cache`
+        self.pending_http_cache = {}
+
+        # hash of the last parsed page and how many times in a row nothing changed
+        self.fingerprint = None
+        self.unchanged_count = 0
+
+        # (html, fingerprint) of the last hashed page, checking and then remembering it hashes only once
+        self._last_hashed = None
+
+        # sizes of downloaded pages in bytes by url, reported as `bytes_downloaded` metric
+        self.response_sizes = {}
+
+    @classmethod
+    def get_session(cls, url: str) -> "requests.Session":
+        """
+        Returns pooled, kept-alive session for the host of `url`
+        """
+
+        host = urlparse(url).netloc
+
+        with cls._sessions_lock:
+            session = cls._sessions.get(host)
+
+            if session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from http.cookiejar import DefaultCookiePolicy
+
+                session = requests.Session()
+
+                # cookies set by servers aren't kept between requests, like with plain `requests.get`,
+                # sessions are shared by all scrapers of a host, each one sends its own `cookies`
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.SESSION_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                cls._sessions[host] = session
+
+        return session
+
+    def get_conditional_headers(self, url: str) -> dict:
+        validators = self.http_cache.get(url, {})
+
+        rv = {}
+        if validators.get("etag"):
+            rv['If-None-Match'] = validators["etag"]
+        if validators.get("last_modified"):
+            rv['If-Modified-Since'] = validators["last_modified"]
+
+        return rv
+
     def get_html(self, url: str=None, headers: dict=None, cookies: dict=None) -> str:
         """
         Makes a request to `url` if it succeds, returns html, otherwise raises Exception
+        raises PageNotModified if the server says the page didn't change since the last request
         """
 
 
         if url is None:
             url = self.url
 
+        self.response_sizes.pop(url, None)
+        self.pending_http_cache.pop(url, None)
+
         if headers is None:
             headers = self.headers
 
@@ -48,16 +155,96 @@ class BaseScraper():
             cookies = self.cookies
 
 
-        req = requests.get(url, headers=headers, cookies=cookies)
+        if self.use_http_cache:
+            headers = {**headers, **self.get_conditional_headers(url)}
+
+        req = self.get_session(url).get(url, headers=headers, cookies=cookies)
+
+        self.response_sizes[url] = len(req.content)
+
+        if req.status_code == 304:
+            raise PageNotModified(f"Page not modified, url {url}")
 
         # check if request was successful
         if req.ok:
+            if self.use_http_cache:
+                self.pending_http_cache[url] = {
+                    "etag": req.headers.get('ETag'),
+                    "last_modified": req.headers.get('Last-Modified'),
+                }
+
             return req.text
         else:
             raise Exception(f"Request failed, code: {req.status_code}, url {req.url}")
 
 
+    def commit_http_cache(self, url: str) -> None:
+        """
+        Keeps validators of the last response from `url`, call only once the page's articles are stored,
+        otherwise a failed run would make the next one get 304 for a page that was never stored
+        """
+
+        validators = self.pending_http_cache.pop(url, None)
+        if validators is not None:
+            self.http_cache[url] = validators
+
+    def normalize_html(self, html: str) -> str:
+        """
+        Returns html without parts that change even if the content doesn't
+        """
+
+        html = re.sub(r"<script.*?</script>|<style.*?</style>|<!--.*?-->", "", html, flags=re.DOTALL | re.IGNORECASE)
+        html = re.sub(r"\s+", " ", html)
+
+        return html
+
+    def get_fingerprint(self, html: str) -> str:
+        if self._last_hashed is not None and self._last_hashed[0] is html:
+            return self._last_hashed[1]
+
+        normalized = self.normalize_html(html) if self.normalize_fingerprint else html
+        fingerprint = sha256(normalized.encode()).hexdigest()
+
+        self._last_hashed = (html, fingerprint)
+        return fingerprint
+
+    def is_page_unchanged(self, html: str) -> bool:
+        """
+        Compares fingerprint of `html` with the one of the last stored page, doesn't change any state
+        """
+
+        if not self.use_fingerprint:
+            return False
+
+        return self.get_fingerprint(html) == self.fingerprint
+
+    def update_fingerprint(self, html: str) -> None:
+        """
+        Remembers fingerprint of `html`, call only once the page's articles are stored,
+        otherwise a failed run would make the next one skip the page as unchanged
+        """
+
+        self.fingerprint = self.get_fingerprint(html) if self.use_fingerprint else None
+        self.unchanged_count = 0
+        self._last_hashed = None
+
+    def mark_unchanged(self) -> None:
+        self.unchanged_count += 1
+        self._last_hashed = None
+
+    def get_page_urls(self):
+        """
+        Should return (or yield) urls of the pages following `url` in order (page 2, 3...),
+        at most `max_pages` - 1 of them are fetched
+        """
+        return iter([])
+
     def get_data_from_html(self, html: str, max_items: int=None) -> list:
+        """
+        Returns list of scraped articles (dicts), newest first
+
+        Can also be a generator function, articles are then parsed only as long as storage needs them
+        """
         raise NotImplementedError()
 
     def get_cleaned_data(self, data: list) -> list:
@@ -73,5 +260,23 @@ class BaseScraper():
             "scraper_url": self.url,
             "scraper_cookies": self.cookies,
             "scraper_headers": self.headers,
+            "scraper_http_cache": json.dumps(self.http_cache),
+            "scraper_fingerprint": self.fingerprint,
+            "scraper_unchanged_count": self.unchanged_count,
         }
 
+    def load_state_from_row(self, row) -> None:
+        """
+        Restores state saved in storage by previous runs, `row` is this scraper's row from the Scrapers table
+        """
+
+        # validators and fingerprints are useless if the scraper now points somewhere else
+        if row['scraper_url'] != self.url:
+            return
+
+        if row['scraper_http_cache']:
+            self.http_cache = json.loads(row['scraper_http_cache'])
+
+        self.fingerprint = row['scraper_fingerprint']
+        self.unchanged_count = row['scraper_unchanged_count'] or 0
+
@@ -1,16 +1,53 @@
 import sqlite3
 
+from threading import local
+from datetime import datetime, timedelta
 from pathlib import Path
-from hermes.core import fields, tables
+from hermes.core import fields, tables, indexes
+from hermes.core.archives import BaseArchive, JSONLinesArchive, SQLiteArchive
+from hermes.core.filters import SeenFilter, get_article_key
+from hermes.core.profilers import QueryProfiler, ProfilingConnection
 from hermes.core.scrapers import BaseScraper
 
-import logging
-
 class BaseStorage():
     fields = None
+    indexes = None
     row_factory = sqlite3.Row
     DB_NAME = "sqlite3.db"
 
+    # how many keys of already stored articles are kept in memory per scraper
+    SEEN_FILTER_SIZE = 500
+
+    # keep one connection (per thread) open for the whole lifetime of the storage object
+    PERSISTENT_CONNECTION = True
+
+    # time every statement and report the slowest ones after each run, see `enable_profiling`
+    PROFILE_QUERIES = False
+
+    # articles older than this many days are moved to the archive after every run, but the newest N of every scraper are kept,
+    # with only one of them set it applies alone (None - keep forever),
+    # scrapers can override both with `retention_days` and `retention_keep_last`
+    RETENTION_DAYS = None
+    RETENTION_KEEP_LAST = None
+    RETENTION_BATCH_SIZE = 1000
+
+    # "jsonl" (gzip compressed JSON Lines), "sqlite" (separate database) or None to drop expired articles
+    ARCHIVE_FORMAT = "jsonl"
+
+    # max number of free pages returned to the filesystem after each retention pass
+    VACUUM_PAGES = 1000
+
+    # applied to every new connection, WAL lets other processes (e.g. `getarticles`) read while the bot writes
+    PRAGMAS = {
+        # takes effect for new databases, existing ones are converted by `vacuum`
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,
+        "mmap_size": 268435456,
+    }
+
     def __init__(self, parent_dir: str) -> None:
         self.database_path = Path(parent_dir, self.DB_NAME)
         self.base_fields = None
@@ -25,43 +62,139 @@ class BaseStorage():
                     fields.TextFieldSQLite(name="scraper_url", null=False),
                     fields.TextFieldSQLite(name="scraper_name", null=False, use_to_identify=True),
                     fields.TextFieldSQLite(name="scraper_verbose_name", null=False),
+                    fields.TextFieldSQLite(name="scraper_http_cache", null=True),
+                    fields.TextFieldSQLite(name="scraper_fingerprint", null=True),
+                    fields.IntegerFieldSQLite(name="scraper_unchanged_count", null=True),
                 ]),
             "articles":
                 tables.BaseTable(name="Articles", fields=[
                     fields.IntegerFieldSQLite(name="id", primary_key=True),
                     fields.BoolFieldSQLite(name="is_new", null=False),
                     fields.IntegerFieldSQLite(name="scraper", null=False, use_to_identify=True),
+                    fields.IntegerFieldSQLite(name="run", null=True, index=True),
                     fields.ConstraintField(constraint="FOREIGN KEY (scraper) REFERENCES Scrapers (id) ON DELETE CASCADE"),
+                ], indexes=[
+                    # only the few new articles are indexed, keeps get_new fast no matter how many old ones there are
+                    indexes.SQLiteIndex(fields=["is_new"], name="Articles_new", where="is_new=1"),
+                    # rows of a scraper ordered by id, for the seen filter and retention
+                    indexes.SQLiteIndex(fields=["scraper"], name="Articles_scraper"),
+                ]),
+            "runs":
+                tables.BaseTable(name="Runs", fields=[
+                    fields.IntegerFieldSQLite(name="run_id", primary_key=True),
+                    fields.TextFieldSQLite(name="run_started_at", null=False),
+                    fields.TextFieldSQLite(name="run_finished_at", null=True),
+                ]),
+            "article_keys":
+                # what's left of archived articles, enough to not store them as new again
+                tables.BaseTable(name="ArticleKeys", fields=[
+                    fields.IntegerFieldSQLite(name="key_id", primary_key=True),
+                    fields.IntegerFieldSQLite(name="scraper", null=False, use_to_identify=True),
+                    fields.BlobFieldSQLite(name="key", null=False, use_to_identify=True),
+                ]),
+            "notifiers":
+                # last run each notifier delivered, articles of later runs are still owed to it
+                tables.BaseTable(name="Notifiers", fields=[
+                    fields.IntegerFieldSQLite(name="notifier_id", primary_key=True),
+                    fields.TextFieldSQLite(name="notifier_name", null=False, use_to_identify=True),
+                    fields.IntegerFieldSQLite(name="notifier_last_run", null=True),
                 ]),
         }
 
         self.update_custom_fields()
 
+        # connections are per thread, notifiers running in their own threads (see NotifierDispatcher)
+        # can still use the storage, e.g. `get_run_articles`
+        self._local = local()
         self.conn = None
+        self.run_id = None
+
+        # in-memory filters of already stored articles, by scraper id
+        self.seen_filters = {}
+
+        self.profiler = QueryProfiler() if self.PROFILE_QUERIES else None
+
+        # whether ArticleKeys has any rows, None - not checked yet
+        self.archived_keys_exist = None
+
 
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return getattr(self._local, "conn", None)
+
+    @conn.setter
+    def conn(self, conn: sqlite3.Connection) -> None:
+        self._local.conn = conn
 
     def connect(self) -> sqlite3.Connection:
+        # reuse the long-lived connection instead of reopening the db for every `with` block
+        if self.conn is not None and self.PERSISTENT_CONNECTION:
+            return self.conn
+
         try:
-            self.conn = sqlite3.connect(str(self.database_path))
+            if self.profiler is not None:
+                self.conn = sqlite3.connect(str(self.database_path), factory=ProfilingConnection)
+                self.conn.profiler = self.profiler
+            else:
+                # statements aren't traced unless profiling is enabled, tracing slows every statement down
+                self.conn = sqlite3.connect(str(self.database_path))
+
             self.conn.row_factory = self.row_factory
-            self.conn.set_trace_callback(logging.debug)
+            self.apply_pragmas()
         except sqlite3.Error as e:
             raise e
 
         return self.conn
 
+    def apply_pragmas(self) -> None:
+        c = self.conn.cursor()
+
+        for name, value in self.get_pragmas().items():
+            c.execute(f"PRAGMA {name}={value}")
+
+    def get_pragmas(self) -> dict:
+        return self.PRAGMAS
+
+    def enable_profiling(self) -> None:
+        if self.profiler is None:
+            self.profiler = QueryProfiler()
+
+            # the next connection is a profiling one
+            self.close()
+
+    def get_profile_report(self) -> str:
+        """
+        Returns report of statements executed since the last call and starts profiling anew
+        """
+
+        report = self.profiler.get_report()
+        self.profiler.reset()
+        return report
+
+    def close(self) -> None:
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
     def __enter__(self):
         self.connect()
         return self
 
-    def __exit__(self, *args, **kwargs):
-        self.conn.close()
+    def __exit__(self, exc_type, *args, **kwargs):
+        if not self.PERSISTENT_CONNECTION:
+            self.close()
+        elif exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
     
     def delete_table(self, table:tables.BaseTable, perform: bool=False):
         c = self.conn.cursor()
         
         if perform:
             c.execute(f"DROP TABLE IF EXISTS {table.name}")
+            self.seen_filters = {}
+            self.archived_keys_exist = None
 
     def delete_db(self, perform: bool=False):
         for key, table in self.tables.items():
@@ -82,6 +215,79 @@ class BaseStorage():
 
         return c.fetchall()
 
+    def iter_query(self, sql: str, key_column: str, key_name: str, conditions: list=None, params: list=None, batch_size: int=1000):
+        """
+        Generator function, yields rows of `sql` (without WHERE) ordered by unique `key_column`, read `batch_size` at a time
+
+        Keyset pagination, every batch is a separate query starting after the last key,
+        so memory use doesn't depend on the size of the table and no read transaction is held between batches
+        """
+
+        if conditions is None:
+            conditions = []
+
+        if params is None:
+            params = []
+
+        c = self.conn.cursor()
+        last_key = None
+
+        while True:
+            where = list(conditions)
+            where_params = list(params)
+
+            if last_key is not None:
+                where.append(f"{key_column}>?")
+                where_params.append(last_key)
+
+            where_sql = f" WHERE {' AND '.join(where)}" if len(where) > 0 else ""
+            c.execute(f"{sql}{where_sql} ORDER BY {key_column} LIMIT ?", (*where_params, batch_size))
+
+            rows = c.fetchmany(batch_size)
+            if len(rows) == 0:
+                return
+
+            yield from rows
+            last_key = rows[-1][key_name]
+
+    def iter_rows_in_table(self, table: tables.BaseTable, batch_size: int=1000):
+        pk = table.get_primary_key_field()
+        return self.iter_query(f"SELECT * FROM {table.name}", pk.name, pk.name, batch_size=batch_size)
+
+    def iter_articles(self, scraper_name: str=None, since: str=None, until: str=None, is_new: bool=None, batch_size: int=1000):
+        """
+        Generator function, yields articles joined with their scraper's name, oldest first
+
+        `since` and `until` are ISO dates (or datetimes) compared with the start of the run that found the article
+        """
+
+        articles = self.tables['articles'].name
+        scrapers = self.tables['scrapers'].name
+        runs = self.tables['runs'].name
+
+        conditions = []
+        params = []
+
+        if scraper_name is not None:
+            conditions.append("s.scraper_name=?")
+            params.append(scraper_name)
+
+        # run ids grow with time, so dates are turned into a range of runs
+        if since is not None:
+            conditions.append(f"a.run>=(SELECT MIN(run_id) FROM {runs} WHERE run_started_at>=?)")
+            params.append(since)
+
+        if until is not None:
+            conditions.append(f"a.run<=(SELECT MAX(run_id) FROM {runs} WHERE run_started_at<?)")
+            params.append(until)
+
+        if is_new is not None:
+            conditions.append("a.is_new=?")
+            params.append(is_new)
+
+        sql = f"SELECT a.*, s.scraper_name FROM {articles} a JOIN {scrapers} s on a.scraper = s.scraper_id"
+        return self.iter_query(sql, "a.id", "id", conditions, params, batch_size)
+
     def get_new(self) -> tuple:
         c = self.conn.cursor()
         c.execute(f"SELECT * FROM {self.tables['articles'].name} a JOIN {self.tables['scrapers'].name} s on a.scraper = s.scraper_id WHERE is_new=1")
@@ -109,63 +315,139 @@ class BaseStorage():
             self.conn.commit()
 
     def mark_old_all(self) -> None:
-        for row in self.get_new():
-            self.mark_old(row)
+        c = self.conn.cursor()
+        c.execute(f"UPDATE {self.tables['articles'].name} SET is_new=? WHERE is_new=1", (False,))
+        self.conn.commit()
+
+    def start_run(self) -> int:
+        """
+        Registers a new run, articles stored from now on are assigned to it
+        returns id of the run
+        """
+
+        c = self.conn.cursor()
+        c.execute(f"INSERT INTO {self.tables['runs'].name}(run_started_at) VALUES (?)", (datetime.now().isoformat(timespec='seconds'),))
+        self.conn.commit()
+
+        self.run_id = c.lastrowid
+        return self.run_id
+
+    def finish_run(self) -> None:
+        c = self.conn.cursor()
+        c.execute(f"UPDATE {self.tables['runs'].name} SET run_finished_at=? WHERE run_id=?", (datetime.now().isoformat(timespec='seconds'), self.run_id))
+        self.conn.commit()
+
+    def get_run_articles(self, run_id: int) -> list:
+        """
+        Returns articles that were found during run `run_id`
+        """
+
+        c = self.conn.cursor()
+        c.execute(f"SELECT * FROM {self.tables['articles'].name} a JOIN {self.tables['scrapers'].name} s on a.scraper = s.scraper_id WHERE a.run=?", (run_id,))
+
+        return c.fetchall()
+
+    def get_undelivered(self, last_run: int) -> list:
+        """
+        Returns articles already marked old that were found after run `last_run`,
+        i.e. the ones a notifier that last delivered `last_run` has missed
+        """
+
+        c = self.conn.cursor()
+        c.execute(f"SELECT * FROM {self.tables['articles'].name} a JOIN {self.tables['scrapers'].name} s on a.scraper = s.scraper_id WHERE a.is_new=0 AND a.run>?", (last_run,))
+
+        return c.fetchall()
+
+    def get_notifier_runs(self) -> dict:
+        """
+        Returns dict of notifier name -> id of the last run it delivered
+        """
+
+        c = self.conn.cursor()
+        c.execute(f"SELECT notifier_name, notifier_last_run FROM {self.tables['notifiers'].name}")
+
+        return {row['notifier_name']: row['notifier_last_run'] for row in c.fetchall()}
+
+    def set_notifier_runs(self, runs: dict) -> None:
+        """
+        Saves id of the last run delivered by every notifier in `runs` (notifier name -> run id),
+        notifiers left out are forgotten so that removed ones don't hold back retention
+        """
+
+        c = self.conn.cursor()
+        schema = self.tables['notifiers'].compile()
+
+        c.execute(f"DELETE FROM {schema.name} WHERE notifier_name NOT IN ({', '.join(['?'] * len(runs))})", tuple(runs))
+        c.executemany(schema.upsert_sql, [schema.get_row({"notifier_name": name, "notifier_last_run": run_id}) for name, run_id in runs.items()])
+        self.conn.commit()
 
 
     def create_tables_if_not_exist(self) -> None:
         c = self.conn.cursor()
 
         for key, table in self.tables.items():
+            schema = table.compile()
 
-            # create a string of all field that can be directly appended to sql query
-            field_strings = []
-            for field in table.get_fields():
-                field_str = field.get_field_as_string()
-                field_strings.append(field_str)
+            c.execute(schema.create_sql)
 
-            fields = ', '.join(field_strings)
-            sql = f"CREATE TABLE IF NOT EXISTS {table.name} ({fields});"
+            self.add_missing_columns(table)
 
-            c.execute(sql)
+            # unique index over identification fields also lets inserts skip duplicates with ON CONFLICT
+            for index in schema.indexes:
+                c.execute(index.get_index_as_string(table.name))
         
         self.conn.commit()
 
+    def add_missing_columns(self, table: tables.BaseTable) -> None:
+        """
+        Adds columns of fields that were introduced after the table had been created
+        """
+
+        c = self.conn.cursor()
+
+        c.execute(f"PRAGMA table_info({table.name})")
+        existing_columns = [row['name'] for row in c.fetchall()]
+
+        for field in table.compile().fields:
+            if not isinstance(field, fields.SQLiteField) or field.name in existing_columns:
+                continue
+
+            c.execute(f"ALTER TABLE {table.name} ADD COLUMN {field.get_field_as_string()}")
+
     def update_or_create_scrapers(self, scrapers: list) -> None:
         c = self.conn.cursor()
+        schema = self.tables['scrapers'].compile()
 
         for scraper in scrapers:
             scraper_attrs = scraper.get_attrs_as_dict()
 
-            row = [(field.name, scraper_attrs.get(field.name)) for field in self.tables['scrapers'].get_fields()]
-            row = dict(row)
+            # scraper with identical name but different parameters keeps its id and state, the rest is replaced
+            c.execute(schema.select_by_identification_sql, schema.get_row(scraper_attrs, schema.identification_columns))
+            similar_scraper = c.fetchone()
 
-            # Check is there is a scraper with identical name but different parameters, replace it if there is
-            sql = f"SELECT * FROM {self.tables['scrapers'].name} WHERE "
+            if similar_scraper != None:
+                scraper.load_state_from_row(similar_scraper)
+                scraper_attrs = scraper.get_attrs_as_dict()
 
-            sql += " AND ".join([str(field.name)+"=?" for field in self.tables['scrapers'].get_identification_fields()])
+            c.execute(schema.upsert_sql, schema.get_row(scraper_attrs))
 
-            values = [scraper.get_attrs_as_dict().get(field.name) for field in self.tables['scrapers'].get_identification_fields()]
+        self.conn.commit()
 
-            c.execute(sql, values)
-            similar_scraper = c.fetchone()
-        
-            pk = self.tables['scrapers'].get_primary_key_field()
-            if similar_scraper != None:
-                new_id = similar_scraper[pk.name]
+    def update_scraper_state(self, scraper: BaseScraper) -> None:
+        """
+        Saves state kept by the scraper between runs e.g. http validators, page fingerprint
+        """
 
-                # just delete the similar row and replace it with a new one, its easier to program than UPDATE queries
-                # there should be little scrapers to replace, so it doesnt have to be perfectly efficient
-                c.execute(f"DELETE FROM {self.tables['scrapers'].name} WHERE {pk.name}=?", (new_id,))
-                if c.rowcount == 1:
-                    row.update(
-                        {pk.name: new_id}
-                    ) 
-                    self.conn.commit()
-                else:
-                    raise Exception("Too many rows affected")
+        c = self.conn.cursor()
+        schema = self.tables['scrapers'].compile()
 
-            self.insert_row(row, self.tables['scrapers'].name)
+        scraper_attrs = scraper.get_attrs_as_dict()
+        state_fields = ("scraper_http_cache", "scraper_fingerprint", "scraper_unchanged_count")
+
+        sql = f"UPDATE {schema.name} SET {', '.join([name + '=?' for name in state_fields])} WHERE {schema.identification_where}"
+
+        c.execute(sql, schema.get_row(scraper_attrs, state_fields + schema.identification_columns))
+        self.conn.commit()
 
     def update_custom_fields(self) -> list:
         if self.fields == None:
@@ -176,36 +458,272 @@ class BaseStorage():
         for field in self.custom_fields:
             self.tables['articles'].add_field(field)
 
+        if self.indexes != None:
+            for index in self.indexes:
+                self.tables['articles'].add_index(index)
+
         return self.custom_fields
 
-    def store(self, data: dict, scraper: BaseScraper) -> None:
+    def get_scraper_id(self, scraper: BaseScraper) -> int:
+        c = self.conn.cursor()
+        schema = self.tables['scrapers'].compile()
+
+        c.execute(schema.select_primary_key_sql, schema.get_row(scraper.get_attrs_as_dict(), schema.identification_columns))
+        return int(c.fetchone()[0])
+
+    def get_seen_filter(self, scraper_id: int) -> SeenFilter:
+        """
+        Returns filter of articles already stored for the scraper,
+        it's filled with the most recent articles the first time it's needed
+        """
+
+        if scraper_id in self.seen_filters:
+            return self.seen_filters[scraper_id]
+
         c = self.conn.cursor()
 
+        schema = self.tables['articles'].compile()
+
+        columns = ', '.join(schema.identification_columns)
+        c.execute(f"SELECT {columns} FROM {schema.name} WHERE scraper=? ORDER BY {schema.primary_key_field.name} DESC LIMIT ?", (scraper_id, self.SEEN_FILTER_SIZE))
+
+        seen_filter = SeenFilter(self.SEEN_FILTER_SIZE)
+
+        # oldest first, so that the newest articles are the last to be evicted
+        for row in reversed(c.fetchall()):
+            seen_filter.add(get_article_key(tuple(row)))
+
+        self.seen_filters[scraper_id] = seen_filter
+        return seen_filter
+
+    def store(self, data: list, scraper: BaseScraper, stop_after_known: int=None) -> list:
+        """
+        Inserts scraped articles in a single transaction, articles that are already stored are skipped
+        (known articles are dropped by the in-memory filter, the rest by the unique index over identification fields)
+
+        `data` is consumed lazily, if `stop_after_known` is set it stops after that many known articles in a row,
+        scrapers yield newest articles first so everything after them is known too
+
+        Returns rows of articles that were actually new, joined with their scraper like in get_new
+        """
+
+        c = self.conn.cursor()
+
+        schema = self.tables['articles'].compile()
+        pk_name = schema.primary_key_field.name
+        scraper_id = self.get_scraper_id(scraper)
+        seen_filter = self.get_seen_filter(scraper_id)
+
+        # values shared by all articles of this call
+        common_values = {'scraper': scraper_id, 'is_new': True, 'run': self.run_id}
+        insert_columns = schema.insert_columns
+
+        rows = []
+        keys = []
+        known_in_row = 0
         for row in data:
-            pk = self.tables['scrapers'].get_primary_key_field()
-            sql = f"SELECT {pk.name} FROM {self.tables['scrapers'].name} WHERE "
+            row.update(common_values)
+
+            # keys of stored and archived articles come from values read back from the db
+            key = get_article_key(schema.get_identification_values(row))
+            if key in seen_filter:
+                known_in_row += 1
+                if stop_after_known is not None and known_in_row >= stop_after_known:
+                    break
+                continue
+
+            known_in_row = 0
+
+            rows.append(tuple(map(row.get, insert_columns)))
+            keys.append(key)
+
+        # articles removed by retention are remembered only by their keys
+        archived_keys = self.get_archived_keys(scraper_id, keys)
+        if len(archived_keys) > 0:
+            rows = [row for row, key in zip(rows, keys) if key not in archived_keys]
+            keys = [key for key in keys if key not in archived_keys]
+
+            for key in archived_keys:
+                seen_filter.add(key)
+
+        if len(rows) == 0:
+            return []
+
+        # everything inserted below gets an id greater than this one
+        c.execute(f"SELECT IFNULL(MAX({pk_name}), 0) FROM {schema.name}")
+        last_id = c.fetchone()[0]
+
+        c.executemany(schema.insert_or_ignore_sql, rows)
+
+        # same shape as rows returned by get_new, but only the just inserted rows are read
+        c.execute(f"SELECT * FROM {schema.name} a JOIN {self.tables['scrapers'].name} s on a.scraper = s.scraper_id WHERE a.{pk_name}>? AND a.scraper=?", (last_id, scraper_id))
+        new_rows = c.fetchall()
+
+        self.conn.commit()
 
-            sql += " AND ".join([str(field.name)+"=?" for field in self.tables['scrapers'].get_identification_fields()])
+        # all candidates are in the db now, either inserted or already there
+        for key in keys:
+            seen_filter.add(key)
 
-            values = [scraper.get_attrs_as_dict().get(field.name) for field in self.tables['scrapers'].get_identification_fields()]
+        return new_rows
 
-            c.execute(sql, values)
-            scraper_id = int(c.fetchone()[0])
-            row['scraper'] = scraper_id
+    def get_archived_keys(self, scraper_id: int, keys: list) -> set:
+        """
+        Returns those of `keys` which belong to archived articles
+        """
 
+        c = self.conn.cursor()
+        table_name = self.tables['article_keys'].name
+
+        # nothing was ever archived in most databases, checked once instead of on every call
+        if self.archived_keys_exist is None:
+            c.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})")
+            self.archived_keys_exist = bool(c.fetchone()[0])
+
+        if not self.archived_keys_exist:
+            return set()
+
+        rv = set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            c.execute(f"SELECT key FROM {table_name} WHERE scraper=? AND key IN ({', '.join(['?'] * len(chunk))})", (scraper_id, *chunk))
+            rv.update(row[0] for row in c.fetchall())
+
+        return rv
+
+    def get_archive(self) -> BaseArchive:
+        stem = self.database_path.stem
+
+        if self.ARCHIVE_FORMAT == "jsonl":
+            return JSONLinesArchive(self.database_path.with_name(f"{stem}_archive.jsonl.gz"))
+        elif self.ARCHIVE_FORMAT == "sqlite":
+            return SQLiteArchive(self.database_path.with_name(f"{stem}_archive.db"))
+        elif self.ARCHIVE_FORMAT is None:
+            return None
+        else:
+            raise NotImplementedError(f"Unknown `ARCHIVE_FORMAT` '{self.ARCHIVE_FORMAT}', use 'jsonl', 'sqlite' or None")
+
+    def get_retention(self, scraper: BaseScraper) -> tuple:
+        """
+        Returns (retention days, number of kept articles) for the scraper's articles
+        """
+
+        retention_days = scraper.retention_days if scraper.retention_days is not None else self.RETENTION_DAYS
+        keep_last = scraper.retention_keep_last if scraper.retention_keep_last is not None else self.RETENTION_KEEP_LAST
+
+        return retention_days, keep_last
 
-            sql = f"SELECT 1 FROM {self.tables['articles'].name} WHERE "
+    def get_expiry_conditions(self, scraper_id: int, retention_days: int=None, keep_last: int=None) -> tuple:
+        """
+        Returns SQL conditions matching expired articles of the scraper (all of them have to match) and their parameters,
+        with both policies only articles older than `retention_days` and not among the newest `keep_last` expire
+        no conditions means nothing expires
+        """
 
-            sql += " AND ".join([str(field.name)+"=?" for field in self.tables['articles'].get_identification_fields()])
+        conditions = []
+        params = []
+
+        # age of an article is the start of the run that found it, articles stored before runs were recorded have none
+        if retention_days is not None:
+            c = self.conn.cursor()
+
+            cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec='seconds')
+            c.execute(f"SELECT MAX(run_id) FROM {self.tables['runs'].name} WHERE run_started_at<?", (cutoff,))
+            last_expired_run = c.fetchone()[0]
+
+            if last_expired_run is None:
+                return [], []
+
+            conditions.append("run<=?")
+            params.append(last_expired_run)
+
+        # articles of one run are inserted newest first, so the newest are in the latest run with the lowest ids
+        if keep_last is not None:
+            conditions.append(f"id NOT IN (SELECT id FROM {self.tables['articles'].name} WHERE scraper=? ORDER BY run DESC, id ASC LIMIT ?)")
+            params += [scraper_id, keep_last]
+
+        return conditions, params
+
+    def apply_retention(self, scrapers: list, delivered_run: int=None) -> int:
+        """
+        Moves expired articles of `scrapers` to the archive, keeps their keys so that they aren't stored as new again
+        and returns free pages to the filesystem, articles that weren't notified about yet are never expired,
+        neither are ones found after `delivered_run` that some notifier still has to deliver
+
+        Archive is written before rows are deleted, an interrupted pass can leave duplicates in the archive but loses nothing
+        Returns number of archived articles
+        """
+
+        c = self.conn.cursor()
 
-            values = [row.get(field.name) for field in self.tables['articles'].get_identification_fields()]
-            c.execute(sql, values)
-            
-            articles = c.fetchall()
+        articles = self.tables['articles'].compile()
+        article_keys = self.tables['article_keys'].compile()
+        archive = self.get_archive()
 
-            if len(articles) == 0:
-                row['is_new'] = True
-                self.insert_row(row, self.tables['articles'].name)
+        archived = 0
+        for scraper in scrapers:
+            retention_days, keep_last = self.get_retention(scraper)
+            if retention_days is None and keep_last is None:
+                continue
+
+            scraper_id = self.get_scraper_id(scraper)
+            conditions, params = self.get_expiry_conditions(scraper_id, retention_days, keep_last)
+
+            if len(conditions) == 0:
+                continue
+
+            if delivered_run is not None:
+                conditions.append("(run IS NULL OR run<=?)")
+                params.append(delivered_run)
+
+            sql = f"SELECT * FROM {articles.name} WHERE scraper=? AND is_new=0 AND {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+
+            while True:
+                c.execute(sql, (scraper_id, *params, self.RETENTION_BATCH_SIZE))
+                rows = c.fetchall()
+
+                if len(rows) == 0:
+                    break
+
+                if archive is not None:
+                    archive.write([{**dict(zip(row.keys(), row)), 'scraper_name': scraper.name} for row in rows])
+
+                keys = [(scraper_id, get_article_key(tuple(row[name] for name in articles.identification_columns))) for row in rows]
+                c.executemany(article_keys.insert_or_ignore_sql, keys)
+                c.executemany(f"DELETE FROM {articles.name} WHERE id=?", [(row['id'],) for row in rows])
+                self.conn.commit()
+
+                archived += len(rows)
+                self.archived_keys_exist = True
+
+        if archived > 0:
+            self.incremental_vacuum()
+
+        return archived
+
+    def incremental_vacuum(self, pages: int=None) -> None:
+        """
+        Frees at most `pages` (VACUUM_PAGES by default) unused pages, only works with auto_vacuum=INCREMENTAL
+        """
+
+        if pages is None:
+            pages = self.VACUUM_PAGES
+
+        c = self.conn.cursor()
+        c.execute("PRAGMA auto_vacuum")
+        if c.fetchone()[0] != 2:
+            return
+
+        c.execute(f"PRAGMA incremental_vacuum({pages})")
+        c.fetchall()
+
+    def vacuum(self) -> None:
+        """
+        Rebuilds the whole database, also switches databases created before auto_vacuum was set to incremental
+        """
+
+        self.conn.commit()
+        self.conn.execute("VACUUM")
 
 
 class SimpleStorage(BaseStorage):
@@ -1,7 +1,86 @@
 from hermes.core.fields import BaseField, SQLiteField
+from hermes.core.indexes import BaseIndex, SQLiteIndex
+
+class TableSchema():
+    """
+    Compiled, read-only form of a table: fields in column order, identification and primary key fields
+    and parameterised statements, built once instead of on every query
+    """
+
+    __slots__ = (
+        "name", "fields", "columns", "insert_columns", "primary_key_field", "identification_fields",
+        "identification_columns", "identification_where", "indexes", "create_sql", "insert_sql",
+        "insert_or_ignore_sql", "upsert_sql", "select_by_identification_sql", "select_primary_key_sql",
+    )
+
+    def __init__(self, name: str, fields: list, indexes: list) -> None:
+        set_attr = super().__setattr__
+
+        columns = tuple(field.name for field in fields if isinstance(field, SQLiteField))
+        primary_keys = [field for field in fields if getattr(field, "primary_key", False)]
+        primary_key_field = primary_keys[0] if len(primary_keys) > 0 else None
+        identification_fields = tuple(field for field in fields if field.can_use_for_identification())
+        identification_columns = tuple(field.name for field in identification_fields)
+
+        # primary key is assigned by sqlite
+        insert_columns = tuple(column for column in columns if primary_key_field is None or column != primary_key_field.name)
+
+        insert_sql = f"INSERT INTO {name}({', '.join(insert_columns)}) VALUES ({', '.join(['?'] * len(insert_columns))})"
+        identification_where = " AND ".join([f"{column}=?" for column in identification_columns])
+
+        set_attr("name", name)
+        set_attr("fields", tuple(fields))
+        set_attr("columns", columns)
+        set_attr("insert_columns", insert_columns)
+        set_attr("primary_key_field", primary_key_field)
+        set_attr("identification_fields", identification_fields)
+        set_attr("identification_columns", identification_columns)
+        set_attr("identification_where", identification_where)
+        set_attr("indexes", tuple(indexes))
+        set_attr("create_sql", f"CREATE TABLE IF NOT EXISTS {name} ({', '.join([field.get_field_as_string() for field in fields])});")
+        set_attr("insert_sql", f"{insert_sql};")
+        set_attr("insert_or_ignore_sql", f"{insert_sql} ON CONFLICT DO NOTHING;")
+
+        if len(identification_columns) > 0:
+            updated = [column for column in insert_columns if column not in identification_columns]
+            if len(updated) > 0:
+                on_conflict = "DO UPDATE SET " + ", ".join([f"{column}=excluded.{column}" for column in updated])
+            else:
+                on_conflict = "DO NOTHING"
+
+            set_attr("upsert_sql", f"{insert_sql} ON CONFLICT({', '.join(identification_columns)}) {on_conflict};")
+            set_attr("select_by_identification_sql", f"SELECT * FROM {name} WHERE {identification_where};")
+        else:
+            set_attr("upsert_sql", None)
+            set_attr("select_by_identification_sql", None)
+
+        if len(identification_columns) > 0 and primary_key_field is not None:
+            set_attr("select_primary_key_sql", f"SELECT {primary_key_field.name} FROM {name} WHERE {identification_where};")
+        else:
+            set_attr("select_primary_key_sql", None)
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only, change the table and compile it again")
+
+    def get_row(self, values: dict, columns: tuple=None) -> tuple:
+        """
+        Returns values of `columns` (insert columns by default) in statement order
+        """
+
+        if columns is None:
+            columns = self.insert_columns
+
+        return tuple(map(values.get, columns))
+
+    def get_identification_values(self, values: dict) -> tuple:
+        """
+        Returns identification values as the database stores them (e.g. "1" in an INTEGER column becomes 1)
+        """
+
+        return tuple(field.to_stored_value(values.get(field.name)) for field in self.identification_fields)
 
 class BaseTable:
-    def __init__(self, name: str=None, fields: list=None) -> None:
+    def __init__(self, name: str=None, fields: list=None, indexes: list=None) -> None:
         
         if isinstance(name, str):
             self.name = name
@@ -20,27 +99,78 @@ class BaseTable:
         else:
             raise TypeError("`fields` argument must be a list of fields")
 
+
+        if indexes is None:
+            self.indexes = []
+        elif isinstance(indexes, list) and all([isinstance(index, BaseIndex) for index in indexes]):
+            self.indexes = indexes
+        else:
+            raise TypeError("`indexes` argument must be a list of indexes")
+
+        # compiled on first use and again after fields or indexes change
+        self.schema = None
+
     def add_field(self, field):
         if isinstance(field, BaseField):
             self.fields.append(field)
+            self.schema = None
         else:
             raise TypeError("`field` argument must be a field object")
 
+    def add_index(self, index):
+        if isinstance(index, BaseIndex):
+            self.indexes.append(index)
+            self.schema = None
+        else:
+            raise TypeError("`index` argument must be an index object")
+
+    def compile(self) -> TableSchema:
+        if self.schema is None:
+            fields = self.get_ordered_fields()
+            self.schema = TableSchema(self.name, fields, self.build_indexes(fields))
+
+        return self.schema
+
+    def get_indexes(self) -> list:
+        """
+        Returns declared indexes, indexes requested by fields
+        and a unique index over identification fields
+        """
+
+        return list(self.compile().indexes)
+
+    def build_indexes(self, fields: list) -> list:
+        rv = []
+
+        identification_fields = [field for field in fields if field.can_use_for_identification()]
+        if len(identification_fields) > 0:
+            rv.append(SQLiteIndex(
+                fields=[field.name for field in identification_fields],
+                name=f"{self.name}_identification",
+                unique=True,
+            ))
+
+        for field in fields:
+            if isinstance(field, SQLiteField) and field.needs_index():
+                rv.append(SQLiteIndex(fields=[field.name], unique=field.unique))
+
+        rv += self.indexes
+
+        return rv
+
     def get_ordered_fields(self) -> list:
         ordered_fields = sorted(self.fields, key=lambda x: x.get_priority(), reverse=True)
 
         return ordered_fields
 
     def get_fields(self) -> list:
-        return self.get_ordered_fields()
+        return list(self.compile().fields)
 
     def get_identification_fields(self) -> list:
-        rv = [field for field in self.get_fields() if field.can_use_for_identification()]
-        return rv
+        return list(self.compile().identification_fields)
 
     def get_primary_key_field(self) -> SQLiteField:
-        rv = [field for field in self.get_fields() if field.primary_key]
-        return rv[0]
+        return self.compile().primary_key_field
 
     def get_fields_by_priority(self, priority: int=None) -> list:
         if isinstance(priority, int):
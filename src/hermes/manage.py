@@ -1,4 +1,5 @@
 import argparse
+from pathlib import Path
 from hermes.manage_commands import Manager
 
 class Hermes:
@@ -8,6 +9,16 @@ class Hermes:
 
         parser = argparse.ArgumentParser(description='Notifer Framework manager tool')
         parser.add_argument('action', action="store", type=str, choices=choices, help='Specify action that app will execute')
+
+        # options of export actions, other actions ignore them
+        parser.add_argument('--format', type=str, choices=["csv", "jsonl", "ndjson"], help='Export format (default csv)')
+        parser.add_argument('--output', '-o', type=Path, help='Export to this file instead of stdout')
+        parser.add_argument('--scraper', type=str, help='Export only articles of the scraper with this name')
+        parser.add_argument('--since', type=str, help='Export only articles found since this ISO date')
+        parser.add_argument('--until', type=str, help='Export only articles found before this ISO date')
+        parser.add_argument('--new', dest='is_new', action='store_const', const=True, help='Export only new articles')
+        parser.add_argument('--old', dest='is_new', action='store_const', const=False, help='Export only old articles')
+        parser.add_argument('--batch-size', type=int, help='Rows read from the database at a time (default 1000)')
         kwargs = parser.parse_args()._get_kwargs()
         kwargs = dict(kwargs)
 
@@ -1,5 +1,5 @@
 from hermes.app import App
-from inspect import getmembers, isfunction, ismethod
+from inspect import getmembers, isfunction, ismethod, signature
 
 from hermes.core.exceptions import ActionDoesNotExistError
 
@@ -21,12 +21,15 @@ class Manager:
             print("required command line argument not found")
             raise e
 
-        self.run(action=action)
+        # options left out on the command line keep the action's defaults
+        options = {name: value for name, value in command.items() if name != 'action' and value is not None}
+
+        self.run(action, **options)
 
     def get_actions(self) -> list:
-        # get all functions that represent application modes of operation (actions), but dont include magic methods
+        # get all functions that represent application modes of operation (actions), but dont include magic and private methods
         methods = getmembers(App, predicate=isfunction)
-        methods = [method[0] for method in methods if not method[0].startswith("__")]
+        methods = [method[0] for method in methods if not method[0].startswith("_")]
         return methods
 
 
@@ -35,4 +38,9 @@ class Manager:
             raise ActionDoesNotExistError("Illegal action, should be safely filtered out before passing it here")
 
         process = getattr(self.app, action)
+
+        # actions get only the options they accept
+        parameters = signature(process).parameters
+        kwargs = {name: value for name, value in kwargs.items() if name in parameters}
+
         process(*args, **kwargs)
\ No newline at end of file
@@ -1,3 +1,20 @@
 VERSION = "v1.1"
 AUTHOR = "NotSirius-A"
 GITHUB_LINK = "https://github.com/NotSirius-A/Hermes-Framework"
+
+
+# Defaults used when settings module doesn't define them
+MAX_CONCURRENT_REQUESTS = 8
+MAX_CONCURRENT_REQUESTS_PER_HOST = 2
+MAX_CONCURRENT_PAGES = 4
+STOP_AFTER_KNOWN = None
+MAX_CONCURRENT_NOTIFIERS = 4
+NOTIFIER_TIMEOUT = None
+POLL_INTERVAL = 900
+MIN_POLL_INTERVAL = 60
+MAX_POLL_INTERVAL = 21600
+POLL_JITTER = 0.1
+METRICS_HOOKS = []
+PROFILE_QUERIES = False
+METRICS_JSON_PATH = None
+METRICS_PROMETHEUS_PATH = None
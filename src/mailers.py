@@ -12,3 +12,15 @@ from email.message import EmailMessage
 
 #         return body
 
+#     def get_profile_key(self, reciever: dict):
+#         # Receivers with the same key share one rendered body, return None to render it for every receiver
+
+#         return None
+
+#     def pre_send(self, articles: list, recievers: list, server):
+#         # `server` is a pool of SMTP connections with `sendmail` and `send_message`,
+#         # borrow a session for other commands
+#         with server.session() as smtp:
+#             smtp.noop()
+
+#         return articles, recievers
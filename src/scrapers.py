@@ -7,6 +7,20 @@ from bs4 import BeautifulSoup
 
 #     def get_data_from_html(self, html, max_items=None):
         
-#         # Scrape data here
+#         # Scrape data here, newest articles first
 
 #         return self.get_cleaned_data(data)
+
+#         # or yield articles one by one, so that parsing stops once storage reaches known articles
+#         # for article in articles:
+#         #     yield article
+
+# Listings split into pages, following pages are fetched a few at a time
+# and going deeper stops at the first page without new articles
+
+# class MyPaginatedScraper(MyScraper):
+#     max_pages = 10
+
+#     def get_page_urls(self):
+#         for page in range(2, self.max_pages + 1):
+#             yield f"{self.url}?page={page}"
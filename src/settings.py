@@ -1,4 +1,3 @@
-import scrapers, storages, mailers
 from pathlib import Path
 import logging, sys
 
@@ -23,24 +22,76 @@ NOTIFY = True
 
 MAX_ARTICLES = 100
 
-scraper_objs = [
-    #scrapers.MyScraper(url="https://url"),
-]
+# Stop storing a scraper's articles after this many already known ones in a row (None - check all)
+STOP_AFTER_KNOWN = None
 
-#storage_obj = storages.MyStorage(BASE_DIR)
+# How many pages are fetched at the same time, in total and from a single host
+MAX_CONCURRENT_REQUESTS = 8
+MAX_CONCURRENT_REQUESTS_PER_HOST = 2
 
-# Importing credentials - example simple implementation
-# with open(Path(BASE_DIR, "crendtials.txt"), 'r') as f:
-#     email = f.readline().strip()
-#     password = f.readline().strip()
+# How many following pages of a paginated scraper (see BaseScraper.max_pages) are requested ahead of parsing,
+# per-host limit above still applies
+MAX_CONCURRENT_PAGES = 4
 
+# How many notifiers run at the same time and how long each one may take, in seconds (None - no limit),
+# a notifier that fails, times out or is skipped gets the articles it missed in its next successful run
+MAX_CONCURRENT_NOTIFIERS = 4
+NOTIFIER_TIMEOUT = None
 
-# notifier_objs = [
-#     mailers.MyMailer(
-#         receivers_path=Path(BASE_DIR, "MyMailer_receivers.json"),
-#         smtp_port=587,
-#         smtp_server="yoursmtp.com",
-#         bot_email=email,
-#         bot_password=password,
-#     ),
-# ]
\ No newline at end of file
+# Used by `serve` - initial poll interval of scrapers in seconds (scrapers can set `poll_interval`),
+# its bounds when it adapts to how often scrapers find new articles and random spread as a fraction of the interval
+POLL_INTERVAL = 900
+MIN_POLL_INTERVAL = 60
+MAX_POLL_INTERVAL = 21600
+POLL_JITTER = 0.1
+
+# Time spent in every phase of a run (fetch, parse, store, get_new, notify, mark_old) by scraper/notifier,
+# bytes downloaded, articles parsed and new, notifications sent. Written after every run when a path is set,
+# .prom file is meant for node_exporter's textfile collector
+METRICS_JSON_PATH = None  # e.g. Path(BASE_DIR, "metrics.json")
+METRICS_PROMETHEUS_PATH = None  # e.g. "/var/lib/node_exporter/textfile_collector/hermes.prom"
+
+# Custom hooks, subclasses of hermes.core.metrics.BaseMetricsHook
+METRICS_HOOKS = []
+
+# Time every SQL statement and log the most expensive ones after each run (slows storage down a bit)
+PROFILE_QUERIES = False
+
+# Objects are built by functions, only when an action needs them (e.g. `info` doesn't),
+# modules with scrapers, storages and mailers are imported inside for the same reason.
+# Plain lists/objects work too, but then they are built on every manage.py call
+
+def scraper_objs():
+    import scrapers
+
+    return [
+        #scrapers.MyScraper(url="https://url"),
+    ]
+
+# def storage_obj():
+#     import storages
+
+#     return storages.MyStorage(BASE_DIR)
+
+
+# def notifier_objs():
+#     import mailers
+
+#     # Importing credentials - example simple implementation
+#     with open(Path(BASE_DIR, "crendtials.txt"), 'r') as f:
+#         email = f.readline().strip()
+#         password = f.readline().strip()
+
+#     return [
+#         mailers.MyMailer(
+#             receivers_path=Path(BASE_DIR, "MyMailer_receivers.json"),  # .jsonl and .db (SQLite) files are read in a streaming way
+#             smtp_port=587,
+#             smtp_server="yoursmtp.com",
+#             bot_email=email,
+#             bot_password=password,
+#             smtp_connections=2,
+#             max_messages_per_connection=100,
+#             max_messages_per_second=10,
+#             recipients_per_envelope=50,  # only for receivers sharing a profile key, see BaseMailer.get_profile_key
+#         ),
+#     ]
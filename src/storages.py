@@ -1,12 +1,23 @@
 from hermes.core.storages import SimpleStorage
-from hermes.core import fields
+from hermes.core import fields, indexes
 
 # class MyStorage(SimpleStorage):
 #     DB_NAME = "my_storage.db"
 
+#     # Move articles older than 90 days, but always keep the newest 200 of every scraper,
+#     # to my_storage_archive.jsonl.gz after every run, keys of moved articles are kept so they aren't notified about again
+#     RETENTION_DAYS = 90
+#     RETENTION_KEEP_LAST = 200
+#     ARCHIVE_FORMAT = "jsonl"
+
     # fields = [
     #     # Example fields
     #     fields.TextFieldSQLite(name="title", null=False, use_to_identify=True),
-    #     fields.TextFieldSQLite(name="date_acquired", null=False),
+    #     fields.TextFieldSQLite(name="date_acquired", null=False, index=True),
     #     fields.TextFieldSQLite(name="date_published", null=True, use_to_identify=True),
+    # ]
+
+    # indexes = [
+    #     # Example composite index
+    #     indexes.SQLiteIndex(fields=["scraper", "date_published"]),
     # ]
\ No newline at end of file
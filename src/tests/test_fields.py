@@ -0,0 +1,44 @@
+import sqlite3
+import unittest
+
+from hermes.core import fields
+
+# declared column types, one or more per affinity
+DATA_TYPES = ["INTEGER", "BOOL", "TEXT", "VARCHAR(10)", "REAL", "DOUBLE", "NUMERIC", "DATETIME", "BLOB"]
+
+VALUES = [
+    None, True, False, 0, 12, -3, 2**63 - 1, -2**63,
+    1.0, 1.5, 0.1, 1/3, -0.0, 2.5e-7, 1e20, 1e300, 123456789012345678.0, 9.2233720368547758e18,
+    float("inf"), float("-inf"), float("nan"),
+    "", " ", "abc", "12abc", " 12 ", "\t7\n", "+5", "-0", "-0.0", "00012", ".5", "5.", "1.0", "1e3", "1.5e+3",
+    "1e400", "-1e400", "0x10", "1_000", "inf", "nan", "١٢", "9223372036854775807", "9223372036854775808",
+    b"", b"x",
+]
+
+class StoredValueTest(unittest.TestCase):
+    """
+    `to_stored_value` has to match what SQLite actually stores, article keys are computed from it
+    """
+
+    def test_matches_sqlite(self):
+        columns = []
+        for i, data_type in enumerate(DATA_TYPES):
+            field_class = type(f"Field{i}", (fields.SQLiteField,), {"data_type": data_type})
+            columns.append(field_class(name=f"c{i}", null=True))
+
+        conn = sqlite3.connect(":memory:")
+        conn.execute(f"CREATE TABLE t ({', '.join(field.get_field_as_string() for field in columns)})")
+
+        for value in VALUES:
+            conn.execute("DELETE FROM t")
+            conn.execute(f"INSERT INTO t VALUES ({', '.join(['?'] * len(columns))})", (value,) * len(columns))
+            row = conn.execute("SELECT * FROM t").fetchone()
+
+            for field, stored in zip(columns, row):
+                with self.subTest(value=value, data_type=field.data_type):
+                    # repr tells apart -0.0 and 0.0, type tells apart 1 and 1.0
+                    expected = field.to_stored_value(value)
+                    self.assertEqual((type(expected), repr(expected)), (type(stored), repr(stored)))
+
+if __name__ == "__main__":
+    unittest.main()